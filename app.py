@@ -1,29 +1,102 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.routing import Match
 from dotenv import load_dotenv
 from pathlib import Path
 import google.generativeai as genai
 import os
+import time
+import asyncio
+import json
+import logging
 import uvicorn
-from typing import List
+import aiofiles
+from typing import List, Optional
+
+load_dotenv()
+
+# Pipeline chatter is logged at INFO/DEBUG, so it stays quiet unless LOG_LEVEL asks for it
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "WARNING").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
 
 from lib.tutor import TutorAgent
-from lib.tools.util import QueryRequest, QueryResponse
+from lib.tools.util import QueryRequest, QueryResponse, BatchQueryRequest
+from lib.tools.textCache import get_text_cache
+from lib.tools.llm import run_blocking
+from lib.tools.ingestion import get_ingestion_queue
+from lib.tools.corpus import get_corpus
+from lib.tools.catalog import STATUSES as CATALOG_STATUSES
+from lib.tools.scheduler import OverloadedError, get_llm_scheduler
+from lib.tools.tracing import REQUEST_SECONDS, render_metrics, trace
 
-load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
 
 app = FastAPI(title="Pliny")
 
-if not api_key:
-    raise ValueError("Please set the Gemini API Key in your .env file.")
-genai.configure(api_key=api_key)
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+CHECK_BOOKS_MAX_PAGE_SIZE = 1000
+# Uploads are copied to disk in chunks of this many bytes
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Seconds clients are told to wait after a 503 from an overloaded model queue
+OVERLOAD_RETRY_AFTER = os.getenv("OVERLOAD_RETRY_AFTER", "5")
+
+# The fake backend answers offline, so benchmarks and local runs need no key
+if os.getenv("LLM_BACKEND", "gemini") != "fake":
+    if not api_key:
+        raise ValueError("Please set the Gemini API Key in your .env file.")
+    genai.configure(api_key=api_key)
 
 tutor = TutorAgent()
 
+@app.on_event("startup")
+async def start_corpus_sync():
+    """Index the books directory in the background and keep it in sync"""
+    # The writer's ingestion queue also picks up uploads accepted by other workers
+    get_ingestion_queue()
+    get_corpus().start_background_sync(
+        interval=float(os.getenv("CORPUS_SYNC_INTERVAL", "60")),
+        watch=os.getenv("CORPUS_WATCH", "1") == "1"
+    )
+
+@app.on_event("shutdown")
+async def stop_corpus_sync():
+    get_corpus().stop_background_sync()
+
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+def _route_path(request: Request) -> str:
+    """Path template of the matched route, so per-job URLs share one metrics series"""
+    for route in app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", request.url.path)
+    return "unmatched"
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Time every request, record it on /metrics and report its pipeline spans in Server-Timing"""
+    start = time.perf_counter()
+    with trace(f"{request.method} {request.url.path}") as active:
+        response = await call_next(request)
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        path=_route_path(request),
+        status=response.status_code
+    )
+    response.headers["X-Trace-Id"] = active.trace_id
+    if active.spans:
+        response.headers["Server-Timing"] = active.server_timing()
+    return response
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint: request and stage latency histograms, LLM call counts and prompt sizes"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/", response_class=HTMLResponse)
 async def home():
     html_path = Path("templates/home.html")
@@ -36,19 +109,82 @@ async def on_syllabus_page():
     html_content = html_path.read_text(encoding="utf-8")
     return html_content
 
+def check_model_capacity():
+    """Reject with 503 up front when the model queue is full, since streamed responses cannot change status later"""
+    try:
+        get_llm_scheduler().check_capacity()
+    except OverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": OVERLOAD_RETRY_AFTER})
+
 @app.post("/ask", response_model=QueryResponse)
 async def ask_question(request: QueryRequest):
     try:
-        result = tutor.process(request.question, request.mode)
+        result = await run_blocking(tutor.process, request.question, request.mode)
         return QueryResponse(
             answer=result["answer"],
             agent_used=result["agent_used"],
             tools_used=result.get("tools_used", []),
-            sources=result.get("sources", [])
+            sources=result.get("sources", []),
+            context_tokens=result.get("context_tokens", 0),
+            cached=result.get("cached", False)
         )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Timed out while answering the question")
+    except OverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": OVERLOAD_RETRY_AFTER})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ask/stream")
+async def ask_question_stream(request: QueryRequest):
+    """Stream the answer as Server-Sent Events: a "meta" event, "token" events, then "done" """
+    check_model_capacity()
+    
+    def event_stream():
+        meta_sent = False
+        try:
+            for event in tutor.process_stream(request.question, request.mode):
+                name = event.pop("event")
+                meta_sent = meta_sent or name == "meta"
+                yield f"event: {name}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            # Failures during routing come before any metadata, and clients only show the answer once it arrives
+            if not meta_sent:
+                yield f"event: meta\ndata: {json.dumps({'agent_used': tutor.name, 'tools_used': [], 'sources': []})}\n\n"
+            yield f"event: error\ndata: {json.dumps({'text': str(e), 'error': str(e)})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+    
+    # Starlette iterates sync generators in its thread pool, keeping the event loop free
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/ask/batch")
+async def ask_batch(request: BatchQueryRequest):
+    """Answer many questions, streaming one JSON line per question as each completes"""
+    check_model_capacity()
+    concurrency = max(1, min(request.concurrency, BATCH_MAX_CONCURRENCY))
+    items = [(query.question, query.mode) for query in request.questions]
+    
+    def result_stream():
+        for index, result in tutor.process_batch(items, concurrency):
+            yield json.dumps({
+                "index": index,
+                "question": items[index][0],
+                **QueryResponse(
+                    answer=result["answer"],
+                    agent_used=result["agent_used"],
+                    tools_used=result.get("tools_used", []),
+                    sources=result.get("sources", []),
+                    context_tokens=result.get("context_tokens", 0),
+                    cached=result.get("cached", False)
+                ).model_dump()
+            }) + "\n"
+    
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
 @app.get("/agents")
 async def list_agents():
     """List all available agents and their capabilities"""
@@ -68,44 +204,70 @@ async def list_agents():
     
     return {"agents": agents_info}
 
+@app.get("/router-stats")
+async def router_stats():
+    """Report how often questions are routed locally versus by the LLM classifier, and how speculation fares"""
+    return {
+        "pre_router": tutor.router.pre_router.stats(),
+        "speculation": {"enabled": tutor.speculative, **tutor.speculation_stats}
+    }
+
+@app.get("/llm-stats")
+async def llm_stats():
+    """Report model-call admission: active and waiting calls, rejections and retries"""
+    return {"scheduler": get_llm_scheduler().stats()}
+
 @app.get("/check-books")
-async def check_books_directory():
-    """Check if books directory exists and list available files"""
-    books_dir = Path("books")
+async def check_books_directory(page: int = 1, page_size: int = 100, type: Optional[str] = None,
+                                subject: Optional[str] = None, status: Optional[str] = None, q: Optional[str] = None):
+    """List available files one page at a time, with optional filters and aggregate stats"""
+    books_dir = get_corpus().books_dir
     if not books_dir.exists():
         return {
             "exists": False,
             "message": "Books directory not found. Please create a 'books' directory and add your syllabus materials.",
             "files": []
         }
+    if page < 1 or not 1 <= page_size <= CHECK_BOOKS_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"page must be >= 1 and page_size between 1 and {CHECK_BOOKS_MAX_PAGE_SIZE}")
+    if status is not None and status not in CATALOG_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of: {', '.join(CATALOG_STATUSES)}")
     
-    files = []
-    supported_extensions = {'.txt', '.md', '.pdf', '.docx', '.doc'}
-    
-    for file_path in books_dir.rglob("*"):
-        if file_path.is_file() and file_path.suffix.lower() in supported_extensions:
-            files.append({
-                "name": file_path.name,
-                "path": str(file_path.relative_to(books_dir)),
-                "size": file_path.stat().st_size,
-                "type": file_path.suffix.lower()
-            })
+    # Served from the corpus catalog, which sync and ingestion keep up to date
+    catalog = get_corpus().catalog
+    filters = {"type": type, "subject": subject, "status": status, "search": q}
+    total, files = await run_blocking(catalog.files, (page - 1) * page_size, page_size, **filters)
+    stats = await run_blocking(catalog.stats, **filters)
     
     return {
         "exists": True,
-        "message": f"Found {len(files)} supported files in books directory.",
-        "files": files
+        "message": f"Found {total} supported files in books directory.",
+        "files": files,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "pages": (total + page_size - 1) // page_size,
+        "stats": stats
+    }
+
+@app.get("/cache-stats")
+async def cache_stats():
+    """Report hit/miss counts and size of the extracted-text and answer caches"""
+    return {
+        "text_cache": get_text_cache().stats(),
+        "answer_cache": tutor.answer_cache.stats()
     }
 
 @app.post("/upload-books")
 async def upload_books(files: List[UploadFile] = File(...)):
     """Upload files to the books directory"""
     try:
-        books_dir = Path("books")
+        books_dir = get_corpus().books_dir
         books_dir.mkdir(exist_ok=True)
         
         uploaded_files = []
         skipped_files = []
+        ingestion_jobs = []
         supported_extensions = {'.txt', '.md', '.pdf', '.docx', '.doc'}
         
         for file in files:
@@ -116,27 +278,39 @@ async def upload_books(files: List[UploadFile] = File(...)):
                 continue
             
             # Check if file already exists
-            file_path = books_dir / file.filename
+            file_name = Path(file.filename).name
+            file_path = books_dir / file_name
             if file_path.exists():
                 # Add timestamp to avoid overwriting
-                import time
                 timestamp = int(time.time())
-                name_parts = Path(file.filename).stem, timestamp, Path(file.filename).suffix
+                name_parts = Path(file_name).stem, timestamp, Path(file_name).suffix
                 new_filename = f"{name_parts[0]}_{name_parts[1]}{name_parts[2]}"
                 file_path = books_dir / new_filename
             
-            # Save the file
+            # Stream the file to disk in chunks; the .part name keeps half-written files out of the index
+            part_path = file_path.with_name(file_path.name + ".part")
             try:
-                content = await file.read()
-                file_path.write_bytes(content)
+                async with aiofiles.open(part_path, "wb") as out:
+                    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                        await out.write(chunk)
+                os.replace(part_path, file_path)
                 uploaded_files.append(file_path.name)
             except Exception as e:
+                part_path.unlink(missing_ok=True)
                 skipped_files.append(f"{file.filename} (error: {str(e)})")
+                continue
+            
+            # Extract, chunk and index in the background; queueing writes to the SQLite catalog, so it runs off the event loop
+            ingestion_jobs.append({
+                "file": file_path.name,
+                "job_id": await run_blocking(get_ingestion_queue().submit, file_path)
+            })
         
         return {
             "success": True,
             "uploaded_files": uploaded_files,
             "skipped_files": skipped_files,
+            "ingestion_jobs": ingestion_jobs,
             "message": f"Successfully uploaded {len(uploaded_files)} files"
         }
         
@@ -145,11 +319,25 @@ async def upload_books(files: List[UploadFile] = File(...)):
             "success": False,
             "error": str(e),
             "uploaded_files": [],
-            "skipped_files": []
+            "skipped_files": [],
+            "ingestion_jobs": []
         }
 
+@app.get("/ingest-status")
+async def ingestion_status():
+    """List recent ingestion jobs and whether their books are searchable yet"""
+    return {"jobs": await run_blocking(get_ingestion_queue().jobs)}
+
+@app.get("/ingest-status/{job_id}")
+async def ingestion_job_status(job_id: str):
+    """Status of one ingestion job: queued, processing, indexed or failed"""
+    job = await run_blocking(get_ingestion_queue().status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingestion job")
+    return job
+
 if __name__ == "__main__":
     #Run the commented out part if testing locally.
     #uvicorn.run(app, host="localhost", port=8000) 
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run("app:app", host="0.0.0.0", port=port)
\ No newline at end of file
+    uvicorn.run("app:app", host="0.0.0.0", port=port, workers=int(os.environ.get("WEB_CONCURRENCY", 1)))
\ No newline at end of file
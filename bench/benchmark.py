@@ -0,0 +1,227 @@
+"""Offline benchmark suite for routing, retrieval and the HTTP endpoints.
+
+Builds synthetic corpora of increasing size and, for each one, runs a fresh
+worker process with LLM_BACKEND=fake so no Gemini key or network is needed.
+Each worker measures:
+
+    index     cold corpus sync (extraction + chunking + BM25 indexing)
+    search    Agent._search_documents latency
+    process   TutorAgent.process latency and throughput, half on-syllabus
+    http      POST /ask and GET /check-books through a live uvicorn server
+
+and reports p50/p99 latency, throughput and LLM calls per query.
+
+    python bench/benchmark.py --sizes 10,100,1000,10000 --queries 100 --concurrency 8
+
+Set SHARED_STORES=1 to measure the SQLite-backed stores used with several workers.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+TOPICS = {
+    "math": ["equation", "derivative", "integral", "matrix", "polynomial", "theorem", "algebra", "geometry",
+             "probability", "vector", "logarithm", "function", "limit", "series", "triangle", "fraction"],
+    "physics": ["force", "velocity", "acceleration", "momentum", "energy", "gravity", "friction", "wave",
+                "electron", "magnetic", "voltage", "pressure", "thermodynamics", "quantum", "optics", "mass"],
+    "general": ["history", "empire", "literature", "poetry", "economy", "culture", "revolution", "language",
+                "biology", "cell", "climate", "geography", "philosophy", "democracy", "trade", "art"]
+}
+FILLER = ("the of and a to in is that for it as with was on be by this are from at or an which can "
+          "example chapter section student study note describe explain consider shows").split()
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def latency_summary(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    return {
+        "n": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_qps": len(latencies) / elapsed if elapsed else 0.0
+    }
+
+def build_corpus(books_dir: Path, files: int, words_per_file: int, seed: int = 7):
+    """Write `files` synthetic text books, each dominated by one topic's vocabulary"""
+    rng = random.Random(seed)
+    books_dir.mkdir(parents=True, exist_ok=True)
+    subjects = list(TOPICS)
+    for number in range(files):
+        subject = subjects[number % len(subjects)]
+        words = [rng.choice(TOPICS[subject]) if rng.random() < 0.2 else rng.choice(FILLER) for _ in range(words_per_file)]
+        (books_dir / f"{subject}_{number:05d}.txt").write_text(" ".join(words), encoding="utf-8")
+
+def make_questions(count: int, seed: int = 11) -> List[Dict[str, str]]:
+    """Distinct questions so the answer cache never turns the run into a cache benchmark"""
+    rng = random.Random(seed)
+    subjects = list(TOPICS)
+    questions = []
+    for number in range(count):
+        terms = rng.sample(TOPICS[subjects[number % len(subjects)]], 2)
+        questions.append({
+            "question": f"Explain the {terms[0]} and {terms[1]} relationship, case {number}",
+            "mode": "on-syllabus" if number % 2 == 0 else "off-syllabus"
+        })
+    return questions
+
+def run_timed(func: Callable[[Dict[str, str]], Any], items: List[Dict[str, str]], concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def timed(item):
+        start = time.perf_counter()
+        func(item)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, items))
+    return latency_summary(latencies, time.perf_counter() - start)
+
+def llm_calls() -> int:
+    from lib.tools.models import get_model_registry
+    return sum(client.calls for client in get_model_registry().clients())
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def worker(args) -> Dict[str, Any]:
+    """Runs inside a fresh process whose environment points at one synthetic corpus"""
+    sys.path.insert(0, str(REPO_ROOT))
+    os.chdir(REPO_ROOT)
+    from lib.tools.corpus import get_corpus
+    from lib.tools.syllabusTool import SyllabusTool
+    from lib.tutor import TutorAgent
+
+    results: Dict[str, Any] = {}
+    corpus = get_corpus()
+    start = time.perf_counter()
+    corpus.sync()
+    results["index"] = {"seconds": time.perf_counter() - start, "documents": len(corpus.documents())}
+
+    questions = make_questions(args.queries)
+    syllabus = SyllabusTool()
+    calls = llm_calls()
+    results["search"] = run_timed(lambda item: syllabus._search_documents(item["question"]), questions, args.concurrency)
+    results["search"]["llm_calls_per_query"] = (llm_calls() - calls) / len(questions)
+
+    tutor = TutorAgent()
+    calls = llm_calls()
+    results["process"] = run_timed(lambda item: tutor.process(item["question"], item["mode"]), questions, args.concurrency)
+    results["process"]["llm_calls_per_query"] = (llm_calls() - calls) / len(questions)
+
+    if not args.skip_http:
+        results.update(http_benchmark(args, make_questions(args.queries, seed=13)))
+    return results
+
+def http_benchmark(args, questions: List[Dict[str, str]]) -> Dict[str, Any]:
+    import uvicorn
+    from app import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    url = f"http://127.0.0.1:{port}"
+
+    def ask(item):
+        body = json.dumps(item).encode("utf-8")
+        request = urllib.request.Request(f"{url}/ask", data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=300) as response:
+            response.read()
+
+    def check_books(_):
+        with urllib.request.urlopen(f"{url}/check-books", timeout=300) as response:
+            response.read()
+
+    try:
+        calls = llm_calls()
+        results = {"http_ask": run_timed(ask, questions, args.concurrency)}
+        results["http_ask"]["llm_calls_per_query"] = (llm_calls() - calls) / len(questions)
+        results["http_check_books"] = run_timed(check_books, questions[:20], args.concurrency)
+    finally:
+        server.should_exit = True
+        thread.join()
+    return results
+
+def print_report(size: int, results: Dict[str, Any]):
+    index = results["index"]
+    print(f"\n== {size} files ({index['documents']} indexed in {index['seconds']:.2f}s)")
+    for name, stats in results.items():
+        if name == "index":
+            continue
+        calls = f" llm_calls/q={stats['llm_calls_per_query']:.2f}" if "llm_calls_per_query" in stats else ""
+        print(f"{name:>17}: n={stats['n']} p50={stats['p50_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms "
+              f"throughput={stats['throughput_qps']:.1f}/s{calls}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="comma-separated corpus sizes in files")
+    parser.add_argument("--words", type=int, default=400, help="words per synthetic file")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=20, help="simulated model latency per call")
+    parser.add_argument("--workdir", help="where corpora are built; reused between runs if given")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per size instead of a table")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args)))
+        return
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="tutor-bench-"))
+    for size in [int(size) for size in args.sizes.split(",")]:
+        root = workdir / f"corpus-{size}"
+        if not (root / "books").exists():
+            build_corpus(root / "books", size, args.words)
+        env = {
+            **os.environ,
+            "LLM_BACKEND": "fake",
+            "LLM_FAKE_LATENCY_MS": str(args.latency_ms),
+            "BOOKS_DIR": str(root / "books"),
+            "CORPUS_MANIFEST": str(root / "manifest.json"),
+            "CORPUS_CATALOG": str(root / "catalog.sqlite3"),
+            "CORPUS_INDEX": str(root / "index.sqlite3"),
+            "ANSWER_CACHE_DB": str(root / "answers.sqlite3"),
+            "WRITER_LOCK": str(root / "writer.lock"),
+            "TEXT_CACHE_DIR": str(root / "text"),
+            "CORPUS_WATCH": "0",
+            "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING")
+        }
+        command = [sys.executable, str(Path(__file__).resolve()), "--worker",
+                   "--queries", str(args.queries), "--concurrency", str(args.concurrency)]
+        if args.skip_http:
+            command.append("--skip-http")
+        output = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+        results = json.loads(output.strip().splitlines()[-1])
+        if args.json:
+            print(json.dumps({"files": size, **results}))
+        else:
+            print_report(size, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Micro-benchmark: expression extraction and evaluation on long word problems.
+
+Compares the previous path (three overlapping regex scans, each match sent
+through a character whitelist and eval) with lib.tools.expression, which finds
+each maximal expression in a single pass and evaluates a compiled, LRU-cached
+closure tree. Runs entirely offline; no model or corpus is involved.
+
+    python bench/expression_bench.py --problems 200 --sentences 40 --repeat 5
+"""
+from pathlib import Path
+from typing import Callable, Dict, List
+import argparse
+import math
+import random
+import re
+import sys
+import time
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from lib.tools.expression import compile_expression, evaluate, find_expressions  # noqa: E402
+
+LEGACY_PATTERNS = [
+    r'[\d\+\-\*/\^\(\)\.]+(?:\s*[\+\-\*/\^]\s*[\d\+\-\*/\^\(\)\.]+)+',
+    r'\d+\.?\d*\s*[\+\-\*/\^]\s*\d+\.?\d*',
+    r'\(\s*[\d\+\-\*/\^\(\)\.]+\s*\)'
+]
+SENTENCES = [
+    "A cart of mass {a} kg is pushed with a force of {b} N for {c} s.",
+    "The student computes {a} * {b} + {c} to find the total.",
+    "Next the ratio ({a} + {b}) / {c} is compared with the expected value.",
+    "The block slides {a} m down a ramp inclined at {b} degrees.",
+    "Its kinetic energy is 0.5 * {a} * {b}^2 joules at the bottom.",
+    "Explain why the answer differs from {a} - {b} / {c} in the textbook.",
+    "A wave with frequency {a} Hz travels at {b} m/s through the medium.",
+    "Finally check that sqrt({a}) * {b} is close to {c}.",
+]
+
+def legacy_calculate(expression: str) -> float:
+    """CalculatorTool.execute before the expression engine"""
+    expression = expression.replace(" ", "")
+    allowed_chars = set("0123456789+-*/().^**")
+    if not all(c in allowed_chars for c in expression):
+        raise ValueError("Invalid characters in expression")
+    expression = expression.replace("^", "**")
+    return float(eval(expression, {"__builtins__": {}, "math": math}))
+
+def legacy_extract(question: str) -> Dict[str, float]:
+    """Agent._extract_and_calculate before the expression engine"""
+    calculations = {}
+    for pattern in LEGACY_PATTERNS:
+        for expr in re.findall(pattern, question):
+            expr = expr.strip()
+            if any(op in expr for op in ['+', '-', '*', '/', '^']) and len(expr) > 1:
+                try:
+                    calculations[expr] = legacy_calculate(expr)
+                except Exception:
+                    continue
+    return calculations
+
+def engine_extract(question: str) -> Dict[str, float]:
+    calculations = {}
+    for expr in find_expressions(question):
+        try:
+            calculations[expr] = evaluate(expr)
+        except ValueError:
+            continue
+    return calculations
+
+def make_problems(count: int, sentences: int, seed: int = 5) -> List[str]:
+    rng = random.Random(seed)
+    problems = []
+    for _ in range(count):
+        parts = [rng.choice(SENTENCES).format(a=rng.randint(1, 60), b=rng.randint(1, 30), c=rng.randint(1, 12))
+                 for _ in range(sentences)]
+        problems.append(" ".join(parts))
+    return problems
+
+def measure(func: Callable[[str], Dict[str, float]], problems: List[str], repeat: int) -> Dict[str, float]:
+    found = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for problem in problems:
+            found += len(func(problem))
+    elapsed = time.perf_counter() - start
+    runs = repeat * len(problems)
+    return {"us_per_problem": elapsed / runs * 1e6, "results_per_problem": found / runs}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--problems", type=int, default=200)
+    parser.add_argument("--sentences", type=int, default=40, help="sentences per word problem")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    problems = make_problems(args.problems, args.sentences)
+    print(f"{args.problems} problems, ~{sum(map(len, problems)) // len(problems)} chars each, x{args.repeat}")
+    results = {"legacy regex+eval": measure(legacy_extract, problems, args.repeat)}
+    compile_expression.cache_clear()
+    results["engine (cold cache)"] = measure(engine_extract, problems, 1)
+    results["engine (warm cache)"] = measure(engine_extract, problems, args.repeat)
+    baseline = results["legacy regex+eval"]["us_per_problem"]
+    for name, stats in results.items():
+        print(f"{name:>20}: {stats['us_per_problem']:9.1f}us/problem  {baseline / stats['us_per_problem']:5.2f}x  "
+              f"results/problem={stats['results_per_problem']:.1f}")
+    info = compile_expression.cache_info()
+    print(f"compile cache: hits={info.hits} misses={info.misses} size={info.currsize}/{info.maxsize}")
+
+if __name__ == "__main__":
+    main()
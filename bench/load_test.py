@@ -0,0 +1,78 @@
+"""Concurrent load test for a running tutor server.
+
+Fires --concurrency simultaneous /ask requests while probing GET / in the
+background. Before /ask was moved off the event loop the probes stalled for
+the full duration of every answer; now they should stay in the millisecond
+range and /ask throughput should scale with concurrency.
+
+    python bench/load_test.py --url http://localhost:8000 --requests 40 --concurrency 20
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.request
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def ask(url: str, question: str, mode: str) -> float:
+    body = json.dumps({"question": question, "mode": mode}).encode("utf-8")
+    request = urllib.request.Request(f"{url}/ask", data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=300) as response:
+        response.read()
+    return time.perf_counter() - start
+
+def probe(url: str, stop: threading.Event, latencies: List[float]):
+    """Measure how long the home page takes while /ask requests are in flight"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        with urllib.request.urlopen(f"{url}/", timeout=300) as response:
+            response.read()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.05)
+
+def summarize(name: str, latencies: List[float]):
+    print(f"{name:>8}: n={len(latencies)} "
+          f"p50={percentile(latencies, 50) * 1000:.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.1f}ms "
+          f"max={max(latencies, default=0) * 1000:.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mode", default="off-syllabus")
+    parser.add_argument("--question", default="Explain Newton's second law with an example")
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    probe_latencies: List[float] = []
+    prober = threading.Thread(target=probe, args=(args.url, stop, probe_latencies), daemon=True)
+    prober.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        # Vary the question so caches further down the stack do not hide the work
+        questions = [f"{args.question} (variant {i})" for i in range(args.requests)]
+        ask_latencies = list(pool.map(lambda q: ask(args.url, q, args.mode), questions))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+
+    print(f"{args.requests} requests at concurrency {args.concurrency} in {elapsed:.2f}s "
+          f"({args.requests / elapsed:.2f} req/s, mean {statistics.mean(ask_latencies):.2f}s)")
+    summarize("/ask", ask_latencies)
+    summarize("GET /", probe_latencies)
+
+if __name__ == "__main__":
+    main()
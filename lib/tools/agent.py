@@ -1,219 +1,166 @@
-from typing import Dict, Any, List
-import google.generativeai as genai
-import re
+from typing import Dict, Any, Iterator, List, Tuple
+import logging
+import os
 from pathlib import Path
 
 from lib.tools.util import Tool
+from lib.tools.corpus import get_corpus
+from lib.tools.context import build_context
+from lib.tools.expression import find_expressions
+from lib.tools.retrieval import Passage
+from lib.tools.relevance import get_relevance_ranker
+from lib.tools.llm import generate, generate_stream
+from lib.tools.scheduler import OverloadedError
+from lib.tools.models import get_model_registry
+from lib.tools.tracing import span
+
+logger = logging.getLogger(__name__)
 
 class Agent:
     """Base agent class"""
+    # Number of BM25 passages considered for the prompt context
+    search_top_k = 30
+    # Upper bound on syllabus context tokens per prompt
+    context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+    # Subject label used by the local pre-router, None for general agents
+    subject = None
+    # Prefix of the answer returned when generation fails
+    error_message = "I encountered an error processing your question"
+    
     def __init__(self, name: str, description: str, tools: List[Tool] = None):
         self.name = name
         self.description = description
         self.tools = tools or []
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
-        self.classifier_model = genai.GenerativeModel('gemini-2.0-flash')
+    
+    @property
+    def model(self):
+        """Shared client used to generate answers"""
+        return get_model_registry().get("generator")
+    
+    @property
+    def classifier_model(self):
+        """Shared client used for routing and relevance classification"""
+        return get_model_registry().get("classifier")
     
     def can_handle(self, question: str) -> bool:
         """Determine if this agent can handle the question using AI classification"""
         raise NotImplementedError
     
+    def prepare(self, question: str, mode: str = "off-syllabus") -> Dict[str, Any]:
+        """Build the generation prompt and response metadata for a question.
+        
+        A result without a "prompt" key is already a final answer.
+        """
+        raise NotImplementedError
+    
     def process(self, question: str, mode: str = "off-syllabus") -> Dict[str, Any]:
         """Process the question and return response"""
-        raise NotImplementedError
+        result = self.prepare(question, mode)
+        prompt = result.pop("prompt", None)
+        if prompt is None:
+            return result
+        
+        try:
+            response = generate(self.model, prompt)
+            result["answer"] = response.text
+        except OverloadedError:
+            # Shed load as a 503 rather than an error answer
+            raise
+        except Exception as e:
+            result["answer"] = f"{self.error_message}: {str(e)}"
+            result["error"] = str(e)
+        return result
     
-    def _search_documents(self, question: str, subject_filter: str = None) -> List[Dict[str, str]]:
-        """Search through documents in books directory for relevant content"""
-        books_dir = Path("books")
-        if not books_dir.exists():
-            print(f"Books directory not found: {books_dir}")
+    def process_stream(self, question: str, mode: str = "off-syllabus") -> Iterator[Dict[str, Any]]:
+        """Yield a "meta" event with routing metadata, then "token" events as the answer is generated"""
+        result = self.prepare(question, mode)
+        prompt = result.pop("prompt", None)
+        answer = result.pop("answer", "")
+        yield {"event": "meta", **result}
+        
+        if prompt is None:
+            yield {"event": "token", "text": answer}
+        else:
+            try:
+                for text in generate_stream(self.model, prompt):
+                    yield {"event": "token", "text": text}
+            except Exception as e:
+                yield {"event": "error", "text": f"{self.error_message}: {str(e)}", "error": str(e)}
+        yield {"event": "done"}
+    
+    def _search_passages(self, question: str, subject_filter: str = None) -> List[Tuple[Passage, float]]:
+        """Search through documents in books directory for relevant passages"""
+        corpus = get_corpus()
+        if not corpus.exists():
+            logger.warning("Books directory not found: %s", corpus.books_dir)
             return []
         
-        relevant_content = []
-        supported_extensions = {'.txt', '.md', '.pdf', '.docx', '.doc'}
+        logger.debug("Searching in %s for question: %s", corpus.books_dir, question)
+        with span("search.sync"):
+            corpus.ensure_synced()
         
-        print(f"Searching in {books_dir} for question: {question}")
+        # Method 1: BM25 passage retrieval over the inverted index
+        with span("search.bm25"):
+            hits = corpus.search(question, k=self.search_top_k, subject=subject_filter)
         
-        for file_path in books_dir.rglob("*"):
-            if not file_path.is_file():
-                continue
-                
-            if file_path.suffix.lower() not in supported_extensions:
-                continue
-            
-            # Filter by subject if specified (make it less strict)
-            if subject_filter:
-                file_name_lower = file_path.name.lower()
-                if not (subject_filter.lower() in file_name_lower or 
-                       any(keyword in file_name_lower for keyword in [subject_filter[:4], subject_filter[:5]])):
-                    # Don't skip, just continue checking - subject filter is now optional
-                    pass
-            
-            print(f"Processing file: {file_path}")
-            
-            try:
-                content = ""
-                file_ext = file_path.suffix.lower()
-                
-                if file_ext in ['.txt', '.md']:
-                    content = file_path.read_text(encoding='utf-8', errors='ignore')
-                elif file_ext == '.pdf':
-                    try:
-                        # Try multiple PDF reading methods
-                        print(f"Attempting to read PDF: {file_path}")
-                        
-                        # Method 1: PyPDF2
-                        try:
-                            import PyPDF2
-                            with open(file_path, 'rb') as file:
-                                reader = PyPDF2.PdfReader(file)
-                                content = ""
-                                print(f"PDF has {len(reader.pages)} pages")
-                                for i, page in enumerate(reader.pages[:20]):  # Limit to first 20 pages
-                                    page_text = page.extract_text()
-                                    content += page_text + "\n"
-                                    print(f"Page {i+1} extracted {len(page_text)} characters")
-                                print(f"Total content extracted: {len(content)} characters")
-                        except Exception as pdf_error:
-                            print(f"PyPDF2 failed: {pdf_error}")
-                            
-                            # Method 2: Try pdfplumber as backup
-                            try:
-                                import pdfplumber
-                                print("Trying pdfplumber...")
-                                with pdfplumber.open(file_path) as pdf:
-                                    content = ""
-                                    for i, page in enumerate(pdf.pages[:20]):
-                                        page_text = page.extract_text() or ""
-                                        content += page_text + "\n"
-                                        print(f"Page {i+1} extracted {len(page_text)} characters with pdfplumber")
-                            except ImportError:
-                                print("pdfplumber not available")
-                                # Method 3: Basic text extraction attempt
-                                with open(file_path, 'rb') as f:
-                                    raw_content = f.read()
-                                    # Try to extract any readable text
-                                    content = raw_content.decode('utf-8', errors='ignore')
-                                    # Remove binary junk, keep only readable text
-                                    import re
-                                    content = re.sub(r'[^\x20-\x7E\n\r\t]', ' ', content)
-                                    content = re.sub(r'\s+', ' ', content).strip()
-                                    print(f"Raw extraction yielded {len(content)} characters")
-                            except Exception as backup_error:
-                                print(f"Backup PDF reading failed: {backup_error}")
-                                continue
-                                
-                    except Exception as e:
-                        print(f"All PDF reading methods failed for {file_path}: {e}")
-                        continue
-                elif file_ext in ['.docx']:
-                    try:
-                        from docx import Document
-                        doc = Document(file_path)
-                        content = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-                    except Exception as e:
-                        print(f"Error reading DOCX {file_path}: {e}")
-                        continue
-                else:
-                    # Skip unsupported formats for now
-                    continue
-                
-                if not content.strip():
-                    print(f"No content extracted from {file_path}")
-                    continue
-                
-                print(f"Extracted {len(content)} characters from {file_path}")
-                
-                # Use multiple methods to determine relevance - make it less strict
-                is_relevant = False
-                
-                # Method 1: Simple keyword matching as fallback (more lenient)
-                question_words = [word.lower() for word in question.split() if len(word) > 2]  # Changed from 3 to 2
-                content_lower = content.lower()
-                keyword_matches = sum(1 for word in question_words if word in content_lower)
-                
-                # Be more lenient - even partial matches count
-                if keyword_matches >= 1 or len(question_words) == 0:  # At least one keyword match OR simple question
-                    is_relevant = True
-                    print(f"File {file_path.name} relevant by keyword matching ({keyword_matches} matches from words: {question_words})")
-                
-                # Method 2: Check for common database/storage terms if question is about those topics
-                db_terms = ['storage', 'disk', 'memory', 'database', 'raid', 'ssd', 'flash', 'magnetic', 'performance']
-                if any(term in question.lower() for term in ['storage', 'disk', 'raid', 'ssd', 'database', 'memory']):
-                    if any(term in content_lower for term in db_terms):
-                        is_relevant = True
-                        print(f"File {file_path.name} relevant by database/storage topic matching")
-                
-                # Method 3: AI relevance check (but don't rely solely on it)
-                if not is_relevant:
-                    try:
-                        # Make AI prompt less strict
-                        relevance_prompt = f"""
-                        Could this document help answer the question: "{question}"?
-                        
-                        Document: {file_path.name}
-                        Content preview: {content[:800]}...
-                        
-                        Be generous - if there's ANY connection, even loose, respond YES.
-                        Respond with only "YES" if it could be helpful, "NO" if completely unrelated.
-                        """
-                        
-                        relevance_response = self.classifier_model.generate_content(relevance_prompt)
-                        if relevance_response.text.strip().upper() == "YES":
-                            is_relevant = True
-                            print(f"File {file_path.name} relevant by AI classification")
-                    except Exception as e:
-                        print(f"AI relevance check failed for {file_path}: {e}")
-                        # If AI fails, be very lenient - include most content
-                        if len(content) > 100:  # If we extracted substantial content, include it
-                            is_relevant = True
-                            print(f"Including {file_path.name} due to substantial content ({len(content)} chars)")
-                
-                print(f"Final relevance decision for {file_path.name}: {is_relevant}")
-                
-                if is_relevant:
-                    # Include more content but chunk it appropriately
-                    content_chunk = content[:15000]  # Increased from 2000
-                    relevant_content.append({
-                        "file": str(file_path.name),
-                        "content": content_chunk,
-                        "full_path": str(file_path),
-                        "size": len(content)
-                    })
-                    print(f"Added {file_path.name} to relevant content")
-                else:
-                    print(f"File {file_path.name} not considered relevant")
-                        
-            except Exception as e:
-                print(f"Error processing file {file_path}: {e}")
-                continue
+        # Method 2: Batched AI relevance ranking when no passage shares vocabulary with the question
+        if not hits:
+            with span("search.ai_rank"):
+                ranked = get_relevance_ranker().rank(
+                    self.classifier_model, question, corpus.version,
+                    corpus.ranking_candidates(question, subject_filter), corpus.preview, scope=subject_filter or ""
+                )
+            for rank, doc_id in enumerate(ranked):
+                logger.debug("File %s relevant by AI classification", Path(doc_id).name)
+                # Earlier documents and earlier passages score higher, so the budget keeps the best first
+                for passage in corpus.preview_passages(doc_id):
+                    hits.append((passage, float(len(ranked) - rank) - passage.position / 1000))
+        
+        logger.debug("Found %d relevant passages", len(hits))
+        return hits
+    
+    def _search_documents(self, question: str, subject_filter: str = None) -> List[Dict[str, str]]:
+        """Search through documents in books directory for relevant content, grouped per file"""
+        corpus = get_corpus()
+        passages_by_doc: Dict[str, List[Passage]] = {}
+        scores_by_doc: Dict[str, float] = {}
+        for passage, score in self._search_passages(question, subject_filter):
+            passages_by_doc.setdefault(passage.doc_id, []).append(passage)
+            scores_by_doc[passage.doc_id] = max(scores_by_doc.get(passage.doc_id, 0.0), score)
         
-        print(f"Found {len(relevant_content)} relevant documents")
+        relevant_content = []
+        for doc_id in sorted(passages_by_doc, key=lambda d: scores_by_doc[d], reverse=True):
+            # Keep passages in reading order within each document
+            passages = sorted(passages_by_doc[doc_id], key=lambda p: p.position)
+            relevant_content.append({
+                "file": Path(doc_id).name,
+                "content": "\n...\n".join(passage.text for passage in passages),
+                "full_path": doc_id,
+                "size": corpus.size(doc_id),
+                "score": scores_by_doc[doc_id]
+            })
         return relevant_content
     
-    def _extract_and_calculate(self, question: str) -> tuple[Dict[str, float], List[str]]:
+    def _build_context(self, question: str, subject_filter: str = None) -> Dict[str, Any]:
+        """Syllabus context for a prompt, trimmed to context_token_budget with near-duplicates removed"""
+        hits = self._search_passages(question, subject_filter)
+        with span("search.context"):
+            context = build_context(hits, self.context_token_budget)
+        logger.debug("Built context from %d passages (%d tokens)", context["passages"], context["tokens_used"])
+        return context
+    
+    def _extract_and_calculate(self, question: str) -> tuple[Dict[str, str], List[str]]:
         """Common method to extract mathematical expressions and calculate results"""
-        tools_used = []
         calculations = {}
+        if not (hasattr(self, 'tools') and self.tools):
+            return calculations, []
         
-        # Enhanced pattern to catch more mathematical expressions
-        calc_patterns = [
-            r'[\d\+\-\*/\^\(\)\.]+(?:\s*[\+\-\*/\^]\s*[\d\+\-\*/\^\(\)\.]+)+',
-            r'\d+\.?\d*\s*[\+\-\*/\^]\s*\d+\.?\d*',
-            r'\(\s*[\d\+\-\*/\^\(\)\.]+\s*\)'
-        ]
-        
-        for pattern in calc_patterns:
-            math_expressions = re.findall(pattern, question)
-            for expr in math_expressions:
-                expr = expr.strip()
-                if any(op in expr for op in ['+', '-', '*', '/', '^']) and len(expr) > 1:
-                    try:
-                        if hasattr(self, 'tools') and self.tools:
-                            result = self.tools[0].execute(expr)
-                            calculations[expr] = result
-                            tools_used.append("calculator")
-                    except Exception:
-                        continue
+        # One pass over the question finds each maximal expression once; sub-expressions are not re-evaluated
+        for expr in find_expressions(question):
+            try:
+                # Results keep their unit so the prompt never shows a bare SI number for "5 min - 2 min"
+                calculations[expr] = self.tools[0].describe(expr)
+            except ValueError:
+                continue
         
-        return calculations, list(set(tools_used))
\ No newline at end of file
+        return calculations, ["calculator"] if calculations else []
\ No newline at end of file
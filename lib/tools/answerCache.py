@@ -0,0 +1,178 @@
+from typing import Any, Dict, Optional, Tuple
+from collections import OrderedDict
+from pathlib import Path
+import json
+import re
+import sqlite3
+import threading
+import time
+
+from lib.tools.retrieval import tokenize
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop surrounding punctuation"""
+    text = " ".join(question.lower().split())
+    return re.sub(r"^[^\w(]+|[^\w)]+$", "", text)
+
+class AnswerCache:
+    """LRU + TTL cache of tutor answers keyed by normalized question, mode and corpus version"""
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0, near_duplicate_threshold: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Token-set Jaccard similarity needed for a near-duplicate hit, 0 disables the lookup
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[float, frozenset, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, question: str, mode: str, version: str) -> Tuple[str, str, str]:
+        return normalize_question(question), mode, version
+
+    def get(self, question: str, mode: str, version: str = "") -> Optional[Dict[str, Any]]:
+        key = self._key(question, mode, version)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[2])
+            if entry is not None:
+                del self._entries[key]
+
+            if self.near_duplicate_threshold > 0:
+                result = self._near_duplicate(key, now)
+                if result is not None:
+                    self.near_hits += 1
+                    return result
+
+            self.misses += 1
+            return None
+
+    def _near_duplicate(self, key: Tuple[str, str, str], now: float) -> Optional[Dict[str, Any]]:
+        tokens = frozenset(tokenize(key[0]))
+        if not tokens:
+            return None
+        best_key, best_similarity = None, 0.0
+        for other_key, (created, other_tokens, _) in self._entries.items():
+            if other_key[1:] != key[1:] or now - created > self.ttl or not other_tokens:
+                continue
+            similarity = len(tokens & other_tokens) / len(tokens | other_tokens)
+            if similarity > best_similarity:
+                best_key, best_similarity = other_key, similarity
+        if best_key is None or best_similarity < self.near_duplicate_threshold:
+            return None
+        self._entries.move_to_end(best_key)
+        return dict(self._entries[best_key][2])
+
+    def put(self, question: str, mode: str, version: str, result: Dict[str, Any]):
+        key = self._key(question, mode, version)
+        with self._lock:
+            self._entries[key] = (time.time(), frozenset(tokenize(key[0])), dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = len(self._entries)
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_duplicate_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl
+        }
+
+class SharedAnswerCache(AnswerCache):
+    """AnswerCache kept in SQLite so every worker process serves the answers any of them produced.
+
+    Entries, TTL and LRU eviction are shared through the database; hit and
+    miss counters stay per process.
+    """
+    def __init__(self, db_path: str = ".cache/answers.sqlite3", max_entries: int = 1024, ttl: float = 3600.0,
+                 near_duplicate_threshold: float = 0.0):
+        super().__init__(max_entries, ttl, near_duplicate_threshold)
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers (question TEXT NOT NULL, mode TEXT NOT NULL, version TEXT NOT NULL, "
+            "created REAL NOT NULL, last_access REAL NOT NULL, tokens TEXT NOT NULL, result TEXT NOT NULL, "
+            "PRIMARY KEY (question, mode, version))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_last_access ON answers (last_access)")
+
+    def get(self, question: str, mode: str, version: str = "") -> Optional[Dict[str, Any]]:
+        key = self._key(question, mode, version)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, question, mode, version FROM answers WHERE question = ? AND mode = ? AND version = ? AND created >= ?",
+                key + (now - self.ttl,)
+            ).fetchone()
+            if row is None and self.near_duplicate_threshold > 0:
+                row = self._near_duplicate_row(key, now)
+                if row is not None:
+                    self.near_hits += 1
+            elif row is not None:
+                self.hits += 1
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE answers SET last_access = ? WHERE question = ? AND mode = ? AND version = ?", (now,) + row[1:])
+            return json.loads(row[0])
+
+    def _near_duplicate_row(self, key: Tuple[str, str, str], now: float) -> Optional[Tuple[str, str, str, str]]:
+        tokens = frozenset(tokenize(key[0]))
+        if not tokens:
+            return None
+        best_row, best_similarity = None, 0.0
+        for row in self._conn.execute(
+            "SELECT result, question, mode, version, tokens FROM answers WHERE mode = ? AND version = ? AND created >= ?",
+            (key[1], key[2], now - self.ttl)
+        ):
+            other_tokens = frozenset(row[4].split())
+            if not other_tokens:
+                continue
+            similarity = len(tokens & other_tokens) / len(tokens | other_tokens)
+            if similarity > best_similarity:
+                best_row, best_similarity = row[:4], similarity
+        if best_row is None or best_similarity < self.near_duplicate_threshold:
+            return None
+        return best_row
+
+    def put(self, question: str, mode: str, version: str, result: Dict[str, Any]):
+        key = self._key(question, mode, version)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO answers (question, mode, version, created, last_access, tokens, result) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    key + (now, now, " ".join(sorted(set(tokenize(key[0])))), json.dumps(result))
+                )
+                # Expired entries first, then least recently used ones beyond max_entries
+                self._conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+                self._conn.execute(
+                    "DELETE FROM answers WHERE rowid IN (SELECT rowid FROM answers ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._lock:
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        stats["shared"] = True
+        return stats
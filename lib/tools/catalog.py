@@ -0,0 +1,303 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+from pathlib import Path
+import sqlite3
+import threading
+import time
+import uuid
+
+from lib.tools.extractor import page_count
+
+# queued: uploaded and waiting for ingestion, pending: seen by a scan but not extracted yet,
+# indexed: searchable, empty: extracted but no text found, failed: ingestion raised
+STATUSES = ("queued", "pending", "indexed", "empty", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    rel_path TEXT NOT NULL,
+    type TEXT NOT NULL,
+    subject TEXT,
+    size INTEGER NOT NULL DEFAULT 0,
+    mtime_ns INTEGER NOT NULL DEFAULT 0,
+    digest TEXT,
+    indexed_digest TEXT,
+    status TEXT NOT NULL,
+    characters INTEGER NOT NULL DEFAULT 0,
+    pages INTEGER,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS books_type ON books (type, rel_path);
+CREATE INDEX IF NOT EXISTS books_subject ON books (subject, rel_path);
+CREATE INDEX IF NOT EXISTS books_status ON books (status);
+CREATE INDEX IF NOT EXISTS books_rel_path ON books (rel_path);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    file TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    submitted_at REAL NOT NULL,
+    finished_at REAL,
+    error TEXT,
+    claimed_by TEXT,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, submitted_at);
+"""
+
+# Columns added to the jobs table after its first release, created on older catalogs at startup
+JOB_COLUMNS = {"claimed_by": "TEXT", "claimed_at": "REAL"}
+
+COLUMNS = ("name", "size", "type", "subject", "status", "characters", "pages", "error", "updated_at")
+
+class Catalog:
+    """SQLite catalog of every book and its extraction status, kept up to date by sync and ingestion.
+
+    It also holds the ingestion job table, so with several workers an upload
+    received by any of them is picked up by the writer and its status can be
+    polled through any of them. A claimed job records which process took it,
+    so once the writer lock changes hands the jobs its previous holder left
+    in processing can be failed instead of staying there forever.
+
+    Listing and aggregate queries are answered from indexes here rather than
+    by walking the books directory, so /check-books stays fast and paginated
+    with tens of thousands of files.
+    """
+    def __init__(self, books_dir: Path, db_path: str = ".cache/catalog.sqlite3"):
+        self.books_dir = Path(books_dir)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        # WAL lets readers carry on while a sync writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, type in JOB_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {type}")
+        # Identifies this process's claims; a pid could be reused by the restarted writer
+        self.owner = uuid.uuid4().hex
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _row(self, doc_id: str, status: str, size: int = 0, mtime_ns: int = 0, digest: Optional[str] = None) -> Dict[str, Any]:
+        file_path = Path(doc_id)
+        try:
+            rel_path = str(file_path.relative_to(self.books_dir))
+        except ValueError:
+            rel_path = file_path.name
+        return {
+            "path": doc_id, "name": file_path.name, "rel_path": rel_path, "type": file_path.suffix.lower(),
+            "size": size, "mtime_ns": mtime_ns, "digest": digest, "status": status, "updated_at": time.time()
+        }
+
+    def states(self) -> Dict[str, Tuple[Optional[str], str]]:
+        """(indexed digest, status) for every catalogued path"""
+        with self._lock:
+            return {row["path"]: (row["indexed_digest"], row["status"]) for row in self._conn.execute("SELECT path, indexed_digest, status FROM books")}
+
+    def mark_pending(self, entries: Iterable[Dict[str, Any]]):
+        """Record manifest entries ({path, size, mtime_ns, digest}) that still need extracting"""
+        rows = [self._row(entry["path"], "pending", entry["size"], entry["mtime_ns"], entry["digest"]) for entry in entries]
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO books (path, name, rel_path, type, size, mtime_ns, digest, status, updated_at) "
+                "VALUES (:path, :name, :rel_path, :type, :size, :mtime_ns, :digest, :status, :updated_at) "
+                "ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, "
+                "digest = excluded.digest, status = excluded.status, error = NULL, updated_at = excluded.updated_at",
+                rows
+            )
+
+    def mark_queued(self, file_path: Path):
+        """Record an upload waiting in the ingestion queue"""
+        try:
+            stat = file_path.stat()
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+        except OSError:
+            size, mtime_ns = 0, 0
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO books (path, name, rel_path, type, size, mtime_ns, status, updated_at) "
+                "VALUES (:path, :name, :rel_path, :type, :size, :mtime_ns, :status, :updated_at) "
+                "ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, "
+                "status = excluded.status, error = NULL, updated_at = excluded.updated_at",
+                self._row(str(file_path), "queued", size, mtime_ns)
+            )
+
+    def mark_indexed(self, documents: Iterable[Tuple[str, str, str, int]]):
+        """Record (doc_id, digest, subject, characters) for documents that were just extracted and indexed"""
+        documents = list(documents)
+        if not documents:
+            return
+        known: Dict[str, Tuple[Optional[str], Optional[int]]] = {}
+        with self._lock:
+            for start in range(0, len(documents), 500):
+                chunk = [doc_id for doc_id, _, _, _ in documents[start:start + 500]]
+                for row in self._conn.execute(
+                    f"SELECT path, indexed_digest, pages FROM books WHERE path IN ({', '.join('?' * len(chunk))})", chunk
+                ):
+                    known[row["path"]] = (row["indexed_digest"], row["pages"])
+        rows = []
+        for doc_id, digest, subject, characters in documents:
+            previous_digest, pages = known.get(doc_id, (None, None))
+            # Counting PDF pages means opening the file, so it is only done when the content changed
+            if previous_digest != digest:
+                pages = page_count(Path(doc_id))
+            row = self._row(doc_id, "indexed" if characters else "empty", digest=digest)
+            try:
+                stat = Path(doc_id).stat()
+                row["size"], row["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+            except OSError:
+                pass
+            row.update(subject=subject, characters=characters, pages=pages)
+            rows.append(row)
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO books (path, name, rel_path, type, subject, size, mtime_ns, digest, indexed_digest, status, characters, pages, updated_at) "
+                "VALUES (:path, :name, :rel_path, :type, :subject, :size, :mtime_ns, :digest, :digest, :status, :characters, :pages, :updated_at) "
+                "ON CONFLICT (path) DO UPDATE SET subject = excluded.subject, size = excluded.size, mtime_ns = excluded.mtime_ns, "
+                "digest = excluded.digest, indexed_digest = excluded.indexed_digest, status = excluded.status, "
+                "characters = excluded.characters, pages = excluded.pages, error = NULL, updated_at = excluded.updated_at",
+                rows
+            )
+
+    def mark_failed(self, doc_id: str, error: str):
+        with self.transaction() as conn:
+            conn.execute("UPDATE books SET status = 'failed', error = ?, updated_at = ? WHERE path = ?", (error, time.time(), doc_id))
+
+    def remove(self, doc_ids: Iterable[str]):
+        with self.transaction() as conn:
+            conn.executemany("DELETE FROM books WHERE path = ?", [(doc_id,) for doc_id in doc_ids])
+
+    def _where(self, type: Optional[str], subject: Optional[str], status: Optional[str], search: Optional[str]) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        if type:
+            clauses.append("type = ?")
+            params.append(type.lower() if type.startswith(".") else f".{type.lower()}")
+        if subject:
+            clauses.append("subject = ?")
+            params.append(subject)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if search:
+            clauses.append("rel_path LIKE ? ESCAPE '\\'")
+            params.append("%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def files(self, offset: int = 0, limit: int = 100, type: Optional[str] = None, subject: Optional[str] = None,
+             status: Optional[str] = None, search: Optional[str] = None) -> Tuple[int, List[Dict[str, Any]]]:
+        """One page of books ordered by path, with the total number matching the filters"""
+        where, params = self._where(type, subject, status, search)
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM books{where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT rel_path, {', '.join(COLUMNS)} FROM books{where} "
+                "ORDER BY rel_path LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        files = []
+        for row in rows:
+            record = dict(row)
+            record["path"] = record.pop("rel_path")
+            files.append(record)
+        return total, files
+
+    def stats(self, type: Optional[str] = None, subject: Optional[str] = None, status: Optional[str] = None,
+              search: Optional[str] = None) -> Dict[str, Any]:
+        """Counts, bytes, characters and pages over the books matching the filters"""
+        where, params = self._where(type, subject, status, search)
+        with self._lock:
+            totals = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(characters), 0), COALESCE(SUM(pages), 0) FROM books{where}",
+                params
+            ).fetchone()
+            breakdowns = {
+                column: {
+                    (row[0] or "unknown"): {"count": row[1], "bytes": row[2]}
+                    for row in self._conn.execute(
+                        f"SELECT {column}, COUNT(*), COALESCE(SUM(size), 0) FROM books{where} GROUP BY {column}", params
+                    )
+                }
+                for column in ("status", "type", "subject")
+            }
+        return {
+            "count": totals[0],
+            "total_bytes": totals[1],
+            "total_characters": totals[2],
+            "total_pages": totals[3],
+            "by_status": breakdowns["status"],
+            "by_type": breakdowns["type"],
+            "by_subject": breakdowns["subject"]
+        }
+
+    def add_job(self, job: Dict[str, Any], history: int = 1000):
+        """Record a new ingestion job, keeping only the most recent `history` jobs"""
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, file, path, status, submitted_at, finished_at, error) "
+                "VALUES (:job_id, :file, :path, :status, :submitted_at, :finished_at, :error)",
+                job
+            )
+            conn.execute(
+                "DELETE FROM jobs WHERE job_id NOT IN (SELECT job_id FROM jobs ORDER BY submitted_at DESC LIMIT ?)", (history,)
+            )
+
+    def claim_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Move a queued job to processing; None if it is unknown or another thread or worker took it"""
+        with self.transaction() as conn:
+            if conn.execute(
+                "UPDATE jobs SET status = 'processing', claimed_by = ?, claimed_at = ? WHERE job_id = ? AND status = 'queued'",
+                (self.owner, time.time(), job_id)
+            ).rowcount != 1:
+                return None
+            return dict(conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone())
+
+    def finish_job(self, job_id: str, status: str, error: Optional[str] = None):
+        with self.transaction() as conn:
+            conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE job_id = ?", (status, error, time.time(), job_id))
+
+    def fail_abandoned_jobs(self, error: str) -> List[Dict[str, Any]]:
+        """Fail the jobs left in processing by another process; only the current writer may call this.
+
+        Only the writer claims jobs, so once this process holds the writer
+        lock any processing job it did not claim belongs to a writer that died.
+        """
+        with self.transaction() as conn:
+            abandoned = [
+                dict(row) for row in conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'processing' AND (claimed_by IS NULL OR claimed_by != ?)", (self.owner,)
+                )
+            ]
+            now = time.time()
+            for job in abandoned:
+                conn.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE job_id = ?", (error, now, job["job_id"]))
+                conn.execute("UPDATE books SET status = 'failed', error = ?, updated_at = ? WHERE path = ?", (error, now, job["path"]))
+        return abandoned
+
+    def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute("SELECT * FROM jobs ORDER BY submitted_at")]
+
+    def queued_jobs(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT job_id FROM jobs WHERE status = 'queued' ORDER BY submitted_at")]
@@ -0,0 +1,58 @@
+from typing import Any, Dict, List, Set, Tuple
+from pathlib import Path
+
+from lib.tools.retrieval import Passage, tokenize
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for Gemini prompts (about four characters per token)"""
+    return max(1, len(text) // 4)
+
+def _shingles(text: str, size: int = 3) -> Set[Tuple[str, ...]]:
+    words = tokenize(text)
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def build_context(hits: List[Tuple[Passage, float]], budget_tokens: int, dedup_threshold: float = 0.7) -> Dict[str, Any]:
+    """Pick the highest-scoring passages that fit in budget_tokens, skipping near-duplicates.
+
+    Returns the prompt context grouped by source file, the source file names,
+    the estimated tokens used and the number of passages kept.
+    """
+    selected: List[Passage] = []
+    selected_shingles: List[Set[Tuple[str, ...]]] = []
+    tokens_used = 0
+    for passage, _ in sorted(hits, key=lambda hit: hit[1], reverse=True):
+        # Passages are spans of stored text, decoded here once each
+        text = passage.text
+        cost = estimate_tokens(text)
+        if not selected and cost > budget_tokens:
+            # Never return an empty context just because the best passage is long
+            passage = passage._replace(end=passage.start + budget_tokens * 4)
+            text = passage.text
+            cost = estimate_tokens(text)
+        if tokens_used + cost > budget_tokens:
+            continue
+        shingles = _shingles(text)
+        if any(len(shingles & other) / max(1, len(shingles | other)) >= dedup_threshold for other in selected_shingles):
+            continue
+        selected.append(passage)
+        selected_shingles.append(shingles)
+        tokens_used += cost
+
+    # Present passages grouped by document, in reading order, best document first
+    by_doc: Dict[str, List[Passage]] = {}
+    for passage in selected:
+        by_doc.setdefault(passage.doc_id, []).append(passage)
+    sections = []
+    for doc_id, passages in by_doc.items():
+        passages.sort(key=lambda passage: passage.position)
+        body = "\n...\n".join(passage.text for passage in passages)
+        sections.append(f"From {Path(doc_id).name}:\n{body}")
+
+    return {
+        "context": "\n\n".join(sections),
+        "sources": [Path(doc_id).name for doc_id in by_doc],
+        "tokens_used": tokens_used,
+        "passages": len(selected)
+    }
@@ -0,0 +1,376 @@
+from typing import Dict, List, Optional, Set, Tuple
+from contextlib import nullcontext
+from pathlib import Path
+import hashlib
+import heapq
+import logging
+import os
+import threading
+
+from lib.tools.catalog import Catalog
+from lib.tools.indexStore import IndexStore
+from lib.tools.manifest import CorpusManifest, ManifestDiff
+from lib.tools.retrieval import BM25Index, Passage, TOKEN_PATTERN, merge_stats, span_passages, tokenize
+from lib.tools.preRouter import LocalClassifier
+from lib.tools.textCache import get_text_cache
+from lib.tools.textStore import TextSegment, encode_text, needs_compaction
+from lib.tools.tracing import span
+from lib.tools.workers import SHARED_STORES, is_writer
+
+logger = logging.getLogger(__name__)
+
+# Bytes from the start of a document used as its preview for AI relevance ranking
+PREVIEW_BYTES = 15000
+
+# Folder or file name words that put a book straight into a subject shard
+SUBJECT_KEYWORDS = {
+    "math": {"math", "maths", "mathematics", "calculus", "algebra", "geometry", "trigonometry", "statistics", "probability"},
+    "physics": {"physics", "mechanics", "thermodynamics", "electromagnetism", "optics", "quantum", "relativity"}
+}
+
+_content_classifier: Optional[LocalClassifier] = None
+
+def classify_document(file_path: Path, content: str, min_share: float = 0.5) -> str:
+    """Subject shard for a book: from its folder or file name, else by majority vote over samples of its text.
+
+    file_path is relative to the books directory, so the folders above it never decide the subject.
+    """
+    global _content_classifier
+    words = set(TOKEN_PATTERN.findall(str(file_path).lower()))
+    for subject, keywords in SUBJECT_KEYWORDS.items():
+        if words & keywords:
+            return subject
+    
+    if _content_classifier is None:
+        _content_classifier = LocalClassifier()
+    # Confident votes from short windows; naive Bayes is overconfident on long text
+    words = content.split()[:2000]
+    windows = [" ".join(words[start:start + 40]) for start in range(0, len(words), 40)]
+    votes: Dict[str, int] = {}
+    for window in windows:
+        label, _ = _content_classifier.decide(window)
+        if label is not None:
+            votes[label] = votes.get(label, 0) + 1
+    if votes:
+        label = max(votes, key=votes.get)
+        if label in SUBJECT_KEYWORDS and votes[label] >= min_share * len(windows):
+            return label
+    return "general"
+
+class Corpus:
+    """Indexed view of the books directory shared by every agent.
+
+    With a single worker the index lives in memory and document text in a
+    private memory-mapped TextSegment, so passages are spans rather than
+    strings. Given a store_path, the index, metadata and text live in a shared
+    IndexStore instead: only the process holding the writer lock syncs, and
+    every worker searches the store.
+    """
+    def __init__(self, books_dir: str = "books", manifest_path: str = ".cache/manifest.json",
+                 catalog_path: str = ".cache/catalog.sqlite3", store_path: Optional[str] = None):
+        self.books_dir = Path(books_dir)
+        # One BM25 index per subject shard; global searches merge all of them
+        self.shards: Dict[str, BM25Index] = {}
+        self._subjects: Dict[str, str] = {}
+        self.text_cache = get_text_cache()
+        self._digests: Dict[str, str] = {}
+        # doc_id -> (start, end) of its text in self.texts
+        self._spans: Dict[str, Tuple[int, int]] = {}
+        self._sizes: Dict[str, int] = {}
+        self.manifest = CorpusManifest(self.books_dir, manifest_path)
+        self.catalog = Catalog(self.books_dir, catalog_path)
+        self.store = IndexStore(
+            store_path, postings_cache_terms=int(os.getenv("POSTINGS_CACHE_TERMS", "50000"))
+        ) if store_path else None
+        self._text_dir = Path(catalog_path).parent
+        self.texts = TextSegment(directory=self._text_dir) if self.store is None else None
+        self._version: Optional[str] = None
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._synced = threading.Event()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def exists(self) -> bool:
+        return self.books_dir.exists()
+
+    def ensure_synced(self):
+        """Build the index on first use if the background sync has not done it yet.
+
+        Requests arriving while that sync runs wait for it rather than each
+        scanning the books directory again once it finishes.
+        """
+        if self._synced.is_set():
+            return
+        with self._sync_lock:
+            if not self._synced.is_set():
+                self._sync()
+
+    def sync(self) -> ManifestDiff:
+        """Rescan the manifest and re-index only added, changed or removed files"""
+        with self._sync_lock:
+            return self._sync()
+
+    def _sync(self) -> ManifestDiff:
+        if self.store is not None and not is_writer():
+            # Another worker owns indexing; this one searches the shared store as it stands
+            self._synced.set()
+            return ManifestDiff([], [], [])
+        with span("corpus.scan"):
+            diff = self.manifest.scan(self.text_cache.file_digest)
+        files = self.manifest.files()
+        entries = {entry["path"]: entry["digest"] for entry in files}
+        # Anything whose indexed digest differs from the manifest, including everything on a cold start
+        indexed_digests = self.store.digests() if self.store is not None else dict(self._digests)
+        stale = {doc_id: digest for doc_id, digest in entries.items() if indexed_digests.get(doc_id) != digest}
+        removed = set(indexed_digests) - set(entries)
+        # The catalog persists across restarts, so only files it has not seen indexed show as pending
+        catalogued = self.catalog.states()
+        self.catalog.mark_pending(entry for entry in files if catalogued.get(entry["path"], (None,))[0] != entry["digest"])
+        
+        # Extract every stale file together so the process pool can work on them in parallel
+        paths = {Path(doc_id): digest for doc_id, digest in stale.items()}
+        texts = self.text_cache.get_texts(list(paths), digests=paths) if paths else {}
+        indexed = []
+        if paths or removed:
+            # Readers of a shared store switch to the new corpus in one commit
+            with self.store.transaction() if self.store is not None else nullcontext():
+                for file_path, digest in paths.items():
+                    subject = self._index_text(file_path, digest, texts[file_path])
+                    if catalogued.get(str(file_path), (None,))[0] != digest:
+                        indexed.append((str(file_path), digest, subject, len(texts[file_path])))
+                for doc_id in removed:
+                    self.remove(doc_id)
+                self._compact_text()
+                self._publish_version()
+        self.catalog.mark_indexed(indexed)
+        # Uploads still waiting in the ingestion queue are not in the manifest yet
+        self.catalog.remove(doc_id for doc_id, (_, status) in catalogued.items() if doc_id not in entries and status != "queued")
+        
+        if diff:
+            self.manifest.save()
+            logger.info("Corpus sync: %d added, %d changed, %d removed", len(diff.added), len(diff.changed), len(diff.removed))
+        self._synced.set()
+        return diff
+
+    def start_background_sync(self, interval: float = 60.0, watch: bool = True):
+        """Sync now and then every `interval` seconds, or on filesystem events when watchfiles is installed"""
+        def periodic():
+            while True:
+                try:
+                    self.sync()
+                except Exception as e:
+                    logger.warning("Corpus sync failed: %s", e)
+                self._wake.wait(timeout=interval)
+                self._wake.clear()
+                if self._stop.is_set():
+                    return
+        
+        def watcher():
+            try:
+                from watchfiles import watch
+            except ImportError:
+                return
+            self.books_dir.mkdir(exist_ok=True)
+            for _ in watch(self.books_dir, stop_event=self._stop, rust_timeout=1000):
+                self._wake.set()
+        
+        threading.Thread(target=periodic, name="corpus-sync", daemon=True).start()
+        if watch:
+            threading.Thread(target=watcher, name="corpus-watch", daemon=True).start()
+
+    def stop_background_sync(self):
+        self._stop.set()
+        self._wake.set()
+
+    def ingest(self, file_path: Path, digest: Optional[str] = None):
+        """Extract, chunk and index a single file"""
+        digest = digest or self.text_cache.file_digest(file_path)
+        content = self.text_cache.get_text(file_path)
+        # Extraction runs alongside a sync; the index, manifest and catalog are only changed between syncs
+        with self._sync_lock:
+            subject = self._index_text(file_path, digest, content)
+            self._compact_text()
+            self._publish_version()
+            self.manifest.record(file_path, digest)
+            self.manifest.save()
+            self.catalog.mark_indexed([(str(file_path), digest, subject, len(content))])
+
+    def _index_text(self, file_path: Path, digest: str, content: str) -> str:
+        doc_id = str(file_path)
+        subject = classify_document(self._relative_path(file_path), content)
+        if self.store is not None:
+            self.store.replace_document(doc_id, subject, digest, content)
+            logger.debug("Indexed %s into the shared %s shard (%d characters)", file_path, subject, len(content))
+            return subject
+        data = encode_text(content)
+        with self._lock:
+            self._remove_from_shard(doc_id)
+            start = self.texts.append(data)
+            self.shards.setdefault(subject, BM25Index()).add_document(doc_id, self.texts, start, start + len(data))
+            self._subjects[doc_id] = subject
+            self._digests[doc_id] = digest
+            self._spans[doc_id] = (start, start + len(data))
+            self._sizes[doc_id] = len(content)
+            self._version = None
+        logger.debug("Indexed %s into %s shard (%d characters)", file_path, subject, len(content))
+        return subject
+
+    def _remove_from_shard(self, doc_id: str):
+        subject = self._subjects.pop(doc_id, None)
+        if subject in self.shards:
+            self.shards[subject].remove_document(doc_id)
+
+    def remove(self, doc_id: str):
+        if self.store is not None:
+            self.store.remove_document(doc_id)
+            return
+        with self._lock:
+            self._remove_from_shard(doc_id)
+            self._digests.pop(doc_id, None)
+            self._spans.pop(doc_id, None)
+            self._sizes.pop(doc_id, None)
+            self._version = None
+
+    def _compact_text(self):
+        """Rewrite the text of live documents into a fresh segment once replaced text dominates it"""
+        if self.store is not None:
+            self.store.compact_text()
+            return
+        with self._lock:
+            live_bytes = sum(end - start for start, end in self._spans.values())
+            if not needs_compaction(self.texts.size, live_bytes):
+                return
+            texts = TextSegment(directory=self._text_dir)
+            for doc_id, (start, end) in self._spans.items():
+                new_start = texts.append(self.texts.read_bytes(start, end))
+                self._spans[doc_id] = (new_start, new_start + end - start)
+                self.shards[self._subjects[doc_id]].relocate(doc_id, new_start - start, texts)
+            logger.info("Compacted corpus text from %d to %d bytes", self.texts.size, texts.size)
+            # Passages handed out before the swap keep the old segment alive until they are dropped
+            self.texts = texts
+
+    @staticmethod
+    def _stamp(digests: Dict[str, str]) -> str:
+        stamp = hashlib.sha1()
+        for doc_id in sorted(digests):
+            stamp.update(f"{doc_id}:{digests[doc_id]}\n".encode("utf-8"))
+        return stamp.hexdigest()[:16]
+
+    def _publish_version(self):
+        """Record the new version in the shared store so every worker's answer cache keys change together"""
+        if self.store is not None:
+            self.store.set_version(self._stamp(self.store.digests()))
+
+    @property
+    def version(self) -> str:
+        """Stamp that changes whenever any indexed file is added, changed or removed"""
+        if self.store is not None:
+            return self.store.version() or ""
+        with self._lock:
+            if self._version is None:
+                self._version = self._stamp(self._digests)
+            return self._version
+
+    def documents(self) -> List[str]:
+        if self.store is not None:
+            return self.store.documents()
+        with self._lock:
+            return [doc_id for doc_id, size in self._sizes.items() if size > 0]
+
+    def document_info(self) -> List[Tuple[str, str, int]]:
+        """(doc_id, subject, size) of every non-empty document, without reading any text"""
+        if self.store is not None:
+            return self.store.document_info()
+        with self._lock:
+            return [(doc_id, self._subjects.get(doc_id, "general"), size) for doc_id, size in self._sizes.items() if size > 0]
+
+    def ranking_candidates(self, question: str, subject: Optional[str] = None) -> List[str]:
+        """Documents in the order AI relevance ranking should consider them.
+
+        Only used when BM25 matched nothing, so the text itself offers no
+        signal: the subject's shard comes first, then documents whose path
+        shares words with the question, then larger documents.
+        """
+        terms = set(tokenize(question))
+        def order(info: Tuple[str, str, int]):
+            doc_id, doc_subject, size = info
+            return doc_subject != subject, -len(terms & self._path_words(doc_id)), -size, doc_id
+        return [info[0] for info in sorted(self.document_info(), key=order)]
+
+    def _relative_path(self, file_path: Path) -> Path:
+        """Path below the books directory; files outside it are returned unchanged"""
+        try:
+            return Path(file_path).relative_to(self.books_dir)
+        except ValueError:
+            return Path(file_path)
+
+    def _path_words(self, doc_id: str) -> Set[str]:
+        """Words of a document's path below the books directory"""
+        return set(TOKEN_PATTERN.findall(str(self._relative_path(doc_id)).lower()))
+
+    def preview(self, doc_id: str, limit: int = PREVIEW_BYTES) -> str:
+        """First limit bytes of a document's text, read from the text segment on demand"""
+        if self.store is not None:
+            return self.store.preview(doc_id, limit)
+        with self._lock:
+            texts, span = self.texts, self._spans.get(doc_id)
+        return texts.read(span[0], min(span[1], span[0] + limit)) if span else ""
+
+    def preview_passages(self, doc_id: str) -> List[Passage]:
+        """Passages covering a document's preview, for when retrieval has to fall back to AI ranking"""
+        if self.store is not None:
+            return self.store.preview_passages(doc_id, PREVIEW_BYTES)
+        with self._lock:
+            texts, span = self.texts, self._spans.get(doc_id)
+        return span_passages(doc_id, texts, span[0], min(span[1], span[0] + PREVIEW_BYTES)) if span else []
+
+    def size(self, doc_id: str) -> int:
+        if self.store is not None:
+            document = self.store.document(doc_id)
+            return document[1] if document else 0
+        return self._sizes.get(doc_id, 0)
+
+    def subject(self, doc_id: str) -> str:
+        if self.store is not None:
+            document = self.store.document(doc_id)
+            return document[0] if document else "general"
+        return self._subjects.get(doc_id, "general")
+
+    def shard_sizes(self) -> Dict[str, int]:
+        """Number of indexed passages per subject shard"""
+        if self.store is not None:
+            return self.store.shard_sizes()
+        with self._lock:
+            return {subject: len(shard) for subject, shard in self.shards.items()}
+
+    def search(self, question: str, k: int = 10, subject: Optional[str] = None) -> List[Tuple[Passage, float]]:
+        """Top-k passages from the subject's shard, falling back to every shard when it has no match"""
+        if self.store is not None:
+            return self.store.search(question, k, subject)
+        with self._lock:
+            if subject in self.shards:
+                results = self.shards[subject].search(question, k)
+                if results:
+                    return results
+            # Shards are scored against the whole corpus, so their scores rank the same as one global index
+            terms = set(tokenize(question))
+            stats = merge_stats(shard.stats(terms) for shard in self.shards.values())
+            merged = [hit for shard in self.shards.values() for hit in shard.search(question, k, stats)]
+            return heapq.nlargest(k, merged, key=lambda hit: hit[1])
+
+_corpus: Optional[Corpus] = None
+_corpus_lock = threading.Lock()
+
+def get_corpus() -> Corpus:
+    """Process-wide corpus over the books directory (BOOKS_DIR), in a shared CORPUS_INDEX store when running several workers"""
+    global _corpus
+    with _corpus_lock:
+        if _corpus is None:
+            _corpus = Corpus(
+                books_dir=os.getenv("BOOKS_DIR", "books"),
+                manifest_path=os.getenv("CORPUS_MANIFEST", ".cache/manifest.json"),
+                catalog_path=os.getenv("CORPUS_CATALOG", ".cache/catalog.sqlite3"),
+                store_path=os.getenv("CORPUS_INDEX", ".cache/index.sqlite3") if SHARED_STORES else None
+            )
+        return _corpus
@@ -0,0 +1,134 @@
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import logging
+import multiprocessing
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever extraction output changes so cached text is rebuilt
+EXTRACTOR_VERSION = "2"
+
+SUPPORTED_EXTENSIONS = {'.txt', '.md', '.pdf', '.docx', '.doc'}
+
+# CPU budget for extraction, and how many PDF pages one worker task handles
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+PAGES_PER_TASK = int(os.getenv("EXTRACT_PAGES_PER_TASK", "25"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """Shared process pool for extraction; spawned so workers never inherit live network clients"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+def extract_text(file_path: Path) -> str:
+    """Extract plain text from a supported document, returning "" if nothing could be read"""
+    return extract_many([file_path])[file_path]
+
+def extract_many(file_paths: List[Path]) -> Dict[Path, str]:
+    """Extract several documents at once, spreading files and PDF page ranges across the process pool"""
+    tasks: List[Tuple[Path, str, int, Optional[int]]] = []
+    for file_path in file_paths:
+        if file_path.suffix.lower() == '.pdf':
+            page_count = _pdf_page_count(file_path)
+            if page_count == 0:
+                tasks.append((file_path, str(file_path), 0, None))
+            for start in range(0, page_count, PAGES_PER_TASK):
+                tasks.append((file_path, str(file_path), start, min(start + PAGES_PER_TASK, page_count)))
+        else:
+            tasks.append((file_path, str(file_path), 0, None))
+
+    if len(tasks) > 1 and EXTRACT_WORKERS > 1:
+        futures = [get_extraction_pool().submit(_extract_task, path, start, end) for _, path, start, end in tasks]
+        results = [future.result() for future in futures]
+    else:
+        results = [_extract_task(path, start, end) for _, path, start, end in tasks]
+
+    # Page ranges come back in submission order, so joining them keeps reading order
+    texts: Dict[Path, List[str]] = {file_path: [] for file_path in file_paths}
+    for (file_path, _, _, _), text in zip(tasks, results):
+        texts[file_path].append(text)
+    return {file_path: "".join(parts) for file_path, parts in texts.items()}
+
+def _extract_task(path: str, start: int, end: Optional[int]) -> str:
+    """Worker entry point: extract a whole file, or pages [start, end) of a PDF"""
+    file_path = Path(path)
+    file_ext = file_path.suffix.lower()
+    try:
+        if file_ext in ['.txt', '.md']:
+            return file_path.read_text(encoding='utf-8', errors='ignore')
+        if file_ext == '.pdf':
+            return _extract_pdf_pages(file_path, start, end)
+        if file_ext == '.docx':
+            from docx import Document
+            doc = Document(file_path)
+            return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+    except Exception as e:
+        logger.warning("Error reading %s: %s", file_path, e)
+    # Skip unsupported formats for now
+    return ""
+
+def page_count(file_path: Path) -> Optional[int]:
+    """Number of pages in a PDF, or None for formats without pages"""
+    if file_path.suffix.lower() != '.pdf':
+        return None
+    return _pdf_page_count(file_path)
+
+def _pdf_page_count(file_path: Path) -> int:
+    try:
+        import PyPDF2
+        with open(file_path, 'rb') as file:
+            return len(PyPDF2.PdfReader(file).pages)
+    except Exception:
+        pass
+    try:
+        import pdfplumber
+        with pdfplumber.open(file_path) as pdf:
+            return len(pdf.pages)
+    except Exception:
+        return 0
+
+def _extract_pdf_pages(file_path: Path, start: int, end: Optional[int]) -> str:
+    """Try multiple PDF reading methods on a page range, falling back to raw byte scraping"""
+    # Method 1: PyPDF2
+    try:
+        import PyPDF2
+        with open(file_path, 'rb') as file:
+            reader = PyPDF2.PdfReader(file)
+            return "".join((page.extract_text() or "") + "\n" for page in reader.pages[start:end])
+    except Exception as pdf_error:
+        logger.debug("PyPDF2 failed on %s pages %s-%s: %s", file_path, start, end, pdf_error)
+
+    # Method 2: Try pdfplumber as backup
+    try:
+        import pdfplumber
+        with pdfplumber.open(file_path) as pdf:
+            return "".join((page.extract_text() or "") + "\n" for page in pdf.pages[start:end])
+    except ImportError:
+        logger.debug("pdfplumber not available")
+    except Exception as backup_error:
+        logger.warning("Backup PDF reading failed on %s: %s", file_path, backup_error)
+        return ""
+
+    # Method 3: Basic text extraction attempt, done once per file rather than per range
+    if start > 0:
+        return ""
+    with open(file_path, 'rb') as f:
+        raw_content = f.read()
+    # Try to extract any readable text, removing binary junk
+    content = raw_content.decode('utf-8', errors='ignore')
+    content = re.sub(r'[^\x20-\x7E\n\r\t]', ' ', content)
+    content = re.sub(r'\s+', ' ', content).strip()
+    logger.debug("Raw extraction yielded %d characters from %s", len(content), file_path)
+    return content
@@ -0,0 +1,76 @@
+from typing import Dict, Iterator, Optional
+import json
+import os
+import re
+import threading
+import time
+
+DEFAULT_ANSWER = "This is a canned answer from the offline model. It explains the concept step by step with a short example."
+
+class FakeResponse:
+    """Mimics the .text attribute of a Gemini response or stream chunk"""
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeGenerativeModel:
+    """Deterministic, offline stand-in for genai.GenerativeModel.
+
+    Every call sleeps for `latency` seconds and returns a reply shaped like the
+    one the calling prompt asks for (routing JSON, relevance numbers, YES/NO or
+    an answer). `responses` maps prompt substrings to canned replies and is
+    checked first, so benchmarks can script specific behaviour.
+    """
+    def __init__(self, model_name: str, latency: float = 0.05, responses: Optional[Dict[str, str]] = None, chunk_words: int = 8):
+        self.model_name = model_name
+        self.latency = latency
+        self.responses = responses or {}
+        self.chunk_words = chunk_words
+        self.calls = 0
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars += len(prompt)
+        text = self.reply(prompt)
+        if stream:
+            return self._stream(text)
+        time.sleep(self.latency)
+        return FakeResponse(text)
+
+    def _stream(self, text: str) -> Iterator[FakeResponse]:
+        words = text.split(" ")
+        chunks = [" ".join(words[i:i + self.chunk_words]) + " " for i in range(0, len(words), self.chunk_words)]
+        for chunk in chunks:
+            time.sleep(self.latency / len(chunks))
+            yield FakeResponse(chunk)
+
+    def reply(self, prompt: str) -> str:
+        for pattern, text in self.responses.items():
+            if pattern in prompt:
+                return text
+        if "JSON array" in prompt:
+            # Batch routing: one NONE decision per numbered question
+            count = len(re.findall(r"^\s*\[\d+\] ", prompt, re.MULTILINE))
+            return json.dumps([{"question": number, "agent": "NONE", "confidence": 1} for number in range(1, count + 1)])
+        if "JSON object" in prompt:
+            return json.dumps({"agent": "NONE", "confidence": 1})
+        if "Which of these documents" in prompt:
+            return "1"
+        if 'Respond with only "YES"' in prompt:
+            return "NO"
+        return DEFAULT_ANSWER
+
+def fake_model_from_env(model_name: str) -> FakeGenerativeModel:
+    """Build a fake model from LLM_FAKE_LATENCY_MS and an optional LLM_FAKE_RESPONSES JSON file"""
+    responses: Dict[str, str] = {}
+    responses_path = os.getenv("LLM_FAKE_RESPONSES")
+    if responses_path:
+        with open(responses_path, encoding="utf-8") as f:
+            responses = json.load(f)
+    return FakeGenerativeModel(
+        model_name,
+        latency=float(os.getenv("LLM_FAKE_LATENCY_MS", "50")) / 1000,
+        responses=responses
+    )
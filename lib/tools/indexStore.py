@@ -0,0 +1,392 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+import heapq
+import math
+import sqlite3
+import threading
+import uuid
+
+from lib.tools.retrieval import Passage, span_passages, tokenize
+from lib.tools.textStore import TextSegment, encode_text, needs_compaction
+
+# Bumped whenever the tables change; older stores are dropped and rebuilt by the writer
+SCHEMA_VERSION = 2
+TABLES = ("documents", "passages", "postings", "shards", "meta")
+
+# (passage_id, tf, length) rows of one term in one shard
+Postings = List[Tuple[int, int, int]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    subject TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    text_start INTEGER NOT NULL,
+    text_end INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS passages (
+    id INTEGER PRIMARY KEY,
+    doc_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    text_start INTEGER NOT NULL,
+    text_end INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS passages_doc ON passages (doc_id);
+CREATE TABLE IF NOT EXISTS postings (
+    subject TEXT NOT NULL,
+    term TEXT NOT NULL,
+    passage_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (subject, term, passage_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_passage ON postings (passage_id);
+CREATE TABLE IF NOT EXISTS shards (
+    subject TEXT PRIMARY KEY,
+    passages INTEGER NOT NULL,
+    total_length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+class IndexStore:
+    """BM25 passage index and document metadata in one SQLite file shared by every worker.
+
+    Only the writer process changes it, one transaction per sync, so readers
+    always see a complete corpus. Reads go through per-thread connections with
+    SQLite's memory-mapped I/O, so workers share the OS page cache instead of
+    each holding its own copy of the index.
+
+    Document text lives next to the database in an append-only TextSegment;
+    passages are byte spans into it, named by the meta table so that readers
+    follow compaction into a new segment file.
+
+    Each worker keeps the postings of recently searched terms in memory. The
+    cache is dropped whenever the postings generation, changed in the same
+    transaction as any indexing, differs from the one it was filled under.
+    """
+    def __init__(self, db_path: str = ".cache/index.sqlite3", k1: float = 1.5, b: float = 0.75,
+                 passage_words: int = 200, overlap: int = 40, mmap_bytes: int = 1024 * 1024 * 1024,
+                 postings_cache_terms: int = 50000):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self.passage_words = passage_words
+        self.overlap = overlap
+        self.mmap_bytes = mmap_bytes
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._segments: Dict[str, TextSegment] = {}
+        self._segments_lock = threading.Lock()
+        self.postings_cache_terms = postings_cache_terms
+        self._postings_cache: "OrderedDict[Tuple[str, str], Postings]" = OrderedDict()
+        self._postings_generation: Optional[str] = None
+        self._postings_lock = threading.Lock()
+        self._create_schema()
+
+    def _create_schema(self):
+        if self._connection().execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            return
+        with self.transaction() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+                return
+            for table in TABLES:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            # executescript would commit; run the statements inside this transaction instead
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_bytes)}")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Group writes so readers switch to the new corpus in one step; nested calls join the outer one"""
+        with self._write_lock:
+            conn = self._connection()
+            self._local.depth += 1
+            if self._local.depth == 1:
+                conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                self._local.depth -= 1
+                if self._local.depth == 0:
+                    conn.execute("ROLLBACK")
+                raise
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.execute("COMMIT")
+
+    @contextmanager
+    def snapshot(self) -> Iterator[sqlite3.Connection]:
+        """Read transaction, so a search never mixes two versions of the corpus"""
+        conn = self._connection()
+        if self._local.depth:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+    def _segment_name(self, conn: sqlite3.Connection) -> str:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'text_segment'").fetchone()
+        return row[0] if row else f"{self.db_path.stem}.text.0.bin"
+
+    def _segment(self, name: str) -> TextSegment:
+        with self._segments_lock:
+            segment = self._segments.get(name)
+            if segment is None:
+                segment = self._segments[name] = TextSegment(self.db_path.parent / name)
+            return segment
+
+    def replace_document(self, doc_id: str, subject: str, digest: str, text: str):
+        """Store, chunk and index a document, replacing any previous version of it"""
+        data = encode_text(text)
+        with self.transaction() as conn:
+            self.remove_document(doc_id)
+            # Bytes of a rolled back transaction are left dead in the segment until compaction
+            segment = self._segment(self._segment_name(conn))
+            start = segment.append(data)
+            passages = []
+            for passage in span_passages(doc_id, segment, start, start + len(data), self.passage_words, self.overlap):
+                tokens = tokenize(passage.text)
+                if not tokens:
+                    continue
+                counts: Dict[str, int] = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                passages.append((passage, len(tokens), counts))
+
+            conn.execute(
+                "INSERT INTO documents (doc_id, subject, digest, size, text_start, text_end) VALUES (?, ?, ?, ?, ?, ?)",
+                (doc_id, subject, digest, len(text), start, start + len(data))
+            )
+            total_length = 0
+            for passage, length, counts in passages:
+                passage_id = conn.execute(
+                    "INSERT INTO passages (doc_id, position, text_start, text_end, length) VALUES (?, ?, ?, ?, ?)",
+                    (doc_id, passage.position, passage.start, passage.end, length)
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO postings (subject, term, passage_id, tf, length) VALUES (?, ?, ?, ?, ?)",
+                    [(subject, term, passage_id, tf, length) for term, tf in counts.items()]
+                )
+                total_length += length
+            if passages:
+                conn.execute(
+                    "INSERT INTO shards (subject, passages, total_length) VALUES (?, ?, ?) "
+                    "ON CONFLICT (subject) DO UPDATE SET passages = passages + excluded.passages, "
+                    "total_length = total_length + excluded.total_length",
+                    (subject, len(passages), total_length)
+                )
+            self._bump_generation(conn)
+
+    def remove_document(self, doc_id: str):
+        with self.transaction() as conn:
+            row = conn.execute("SELECT subject FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return
+            passage_ids = [(passage_id,) for passage_id, in conn.execute("SELECT id FROM passages WHERE doc_id = ?", (doc_id,))]
+            if passage_ids:
+                lengths = conn.execute("SELECT COUNT(*), SUM(length) FROM passages WHERE doc_id = ?", (doc_id,)).fetchone()
+                conn.execute(
+                    "UPDATE shards SET passages = passages - ?, total_length = total_length - ? WHERE subject = ?",
+                    (lengths[0], lengths[1], row[0])
+                )
+                conn.executemany("DELETE FROM postings WHERE passage_id = ?", passage_ids)
+                conn.execute("DELETE FROM passages WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            self._bump_generation(conn)
+
+    def _bump_generation(self, conn: sqlite3.Connection):
+        """Invalidate every worker's postings cache once this transaction commits"""
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('postings_generation', ?)", (uuid.uuid4().hex,))
+
+    def compact_text(self):
+        """Copy live documents into a new text segment once replaced text dominates the current one"""
+        with self.transaction() as conn:
+            name = self._segment_name(conn)
+            segment = self._segment(name)
+            live_bytes = conn.execute("SELECT COALESCE(SUM(text_end - text_start), 0) FROM documents").fetchone()[0]
+            if not needs_compaction(segment.size, live_bytes):
+                return
+            generation = int(name.rsplit(".", 2)[-2]) + 1
+            target_name = f"{self.db_path.stem}.text.{generation}.bin"
+            # Older generations go; the current one stays for readers still inside a snapshot that uses it
+            for stale in self.db_path.parent.glob(f"{self.db_path.stem}.text.*.bin"):
+                if stale.name != name:
+                    with self._segments_lock:
+                        self._segments.pop(stale.name, None)
+                    stale.unlink(missing_ok=True)
+            target = self._segment(target_name)
+            for doc_id, start, end in conn.execute("SELECT doc_id, text_start, text_end FROM documents").fetchall():
+                delta = target.append(segment.read_bytes(start, end)) - start
+                conn.execute("UPDATE documents SET text_start = text_start + ?, text_end = text_end + ? WHERE doc_id = ?", (delta, delta, doc_id))
+                conn.execute("UPDATE passages SET text_start = text_start + ?, text_end = text_end + ? WHERE doc_id = ?", (delta, delta, doc_id))
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('text_segment', ?)", (target_name,))
+
+    def set_version(self, version: str):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+
+    def version(self) -> Optional[str]:
+        row = self._connection().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else None
+
+    def digests(self) -> Dict[str, str]:
+        return dict(self._connection().execute("SELECT doc_id, digest FROM documents"))
+
+    def documents(self) -> List[str]:
+        return [doc_id for doc_id, in self._connection().execute("SELECT doc_id FROM documents WHERE size > 0")]
+
+    def document_info(self) -> List[Tuple[str, str, int]]:
+        """(doc_id, subject, size) of every non-empty document"""
+        return self._connection().execute("SELECT doc_id, subject, size FROM documents WHERE size > 0").fetchall()
+
+    def document(self, doc_id: str) -> Optional[Tuple[str, int]]:
+        """(subject, size) of an indexed document"""
+        return self._connection().execute("SELECT subject, size FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+
+    def _preview_span(self, conn: sqlite3.Connection, doc_id: str, limit: int) -> Optional[Tuple[TextSegment, int, int]]:
+        row = conn.execute("SELECT text_start, text_end FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return None
+        return self._segment(self._segment_name(conn)), row[0], min(row[1], row[0] + limit)
+
+    def preview(self, doc_id: str, limit: int = 15000) -> str:
+        """First limit bytes of a document's text"""
+        with self.snapshot() as conn:
+            span = self._preview_span(conn, doc_id, limit)
+        return span[0].read(span[1], span[2]) if span else ""
+
+    def preview_passages(self, doc_id: str, limit: int = 15000) -> List[Passage]:
+        with self.snapshot() as conn:
+            span = self._preview_span(conn, doc_id, limit)
+        return span_passages(doc_id, *span, self.passage_words, self.overlap) if span else []
+
+    def shard_sizes(self) -> Dict[str, int]:
+        return dict(self._connection().execute("SELECT subject, passages FROM shards WHERE passages > 0"))
+
+    def search(self, question: str, k: int = 10, subject: Optional[str] = None) -> List[Tuple[Passage, float]]:
+        """Top-k passages from the subject's shard, falling back to every shard when it has no match"""
+        terms = sorted(set(tokenize(question)))
+        if not terms:
+            return []
+        with self.snapshot() as conn:
+            shards = {row[0]: (row[1], row[2]) for row in conn.execute("SELECT subject, passages, total_length FROM shards WHERE passages > 0")}
+            if subject in shards:
+                scores = self._score(shards[subject], self._postings(conn, [subject], terms)[subject])
+                if scores:
+                    return self._top(conn, scores, k)
+            # Every shard is scored against corpus-wide statistics, as one global index would score it
+            postings = self._postings(conn, list(shards), terms)
+            totals = (sum(n for n, _ in shards.values()), sum(length for _, length in shards.values()))
+            frequencies: Dict[str, int] = {}
+            for postings_by_term in postings.values():
+                for term, rows in postings_by_term.items():
+                    frequencies[term] = frequencies.get(term, 0) + len(rows)
+            scores = {}
+            for postings_by_term in postings.values():
+                scores.update(self._score(totals, postings_by_term, frequencies))
+            return self._top(conn, scores, k)
+
+    def _postings(self, conn: sqlite3.Connection, subjects: List[str], terms: List[str]) -> Dict[str, Dict[str, Postings]]:
+        """Postings of every term in the given shards, keyed by shard then term.
+
+        Terms missing from this worker's cache are fetched together in one query.
+        """
+        row = conn.execute("SELECT value FROM meta WHERE key = 'postings_generation'").fetchone()
+        generation = row[0] if row else None
+        postings: Dict[str, Dict[str, Postings]] = {subject: {} for subject in subjects}
+        missing = []
+        with self._postings_lock:
+            if generation != self._postings_generation:
+                self._postings_cache.clear()
+                self._postings_generation = generation
+            for key in ((subject, term) for subject in subjects for term in terms):
+                cached = self._postings_cache.get(key)
+                if cached is None:
+                    missing.append(key)
+                else:
+                    self._postings_cache.move_to_end(key)
+                    postings[key[0]][key[1]] = cached
+        if not missing:
+            return postings
+
+        fetched: Dict[Tuple[str, str], Postings] = {key: [] for key in missing}
+        missing_subjects = sorted({subject for subject, _ in missing})
+        missing_terms = sorted({term for _, term in missing})
+        rows = conn.execute(
+            f"SELECT subject, term, passage_id, tf, length FROM postings "
+            f"WHERE subject IN ({', '.join('?' * len(missing_subjects))}) AND term IN ({', '.join('?' * len(missing_terms))})",
+            [*missing_subjects, *missing_terms]
+        )
+        for subject, term, passage_id, tf, length in rows:
+            found = fetched.get((subject, term))
+            if found is not None:
+                found.append((passage_id, tf, length))
+        with self._postings_lock:
+            # A sync may have moved the cache to a newer generation while this snapshot was read
+            cacheable = generation == self._postings_generation
+            for key, found in fetched.items():
+                if cacheable:
+                    self._postings_cache[key] = found
+                postings[key[0]][key[1]] = found
+            while len(self._postings_cache) > self.postings_cache_terms:
+                self._postings_cache.popitem(last=False)
+        return postings
+
+    def _score(self, stats: Tuple[int, int], postings_by_term: Dict[str, Postings],
+               frequencies: Optional[Dict[str, int]] = None) -> Dict[int, float]:
+        """BM25 scores of one shard's postings, as BM25Index.search computes them.
+
+        stats is (passages, total length) of the collection scored against, and
+        frequencies its per-term passage counts when that is more than this shard.
+        """
+        n, total_length = stats
+        avg_length = total_length / n
+        scores: Dict[int, float] = {}
+        for term, postings in postings_by_term.items():
+            if not postings:
+                continue
+            frequency = frequencies[term] if frequencies else len(postings)
+            idf = math.log(1 + (n - frequency + 0.5) / (frequency + 0.5))
+            for passage_id, tf, length in postings:
+                norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def _top(self, conn: sqlite3.Connection, scores: Dict[int, float], k: int) -> List[Tuple[Passage, float]]:
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        if not best:
+            return []
+        segment = self._segment(self._segment_name(conn))
+        rows = {
+            row[0]: Passage(row[1], row[2], row[3], row[4], segment)
+            for row in conn.execute(
+                f"SELECT id, doc_id, position, text_start, text_end FROM passages WHERE id IN ({', '.join('?' * len(best))})",
+                [passage_id for passage_id, _ in best]
+            )
+        }
+        return [(rows[passage_id], score) for passage_id, score in best if passage_id in rows]
@@ -0,0 +1,91 @@
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+import logging
+import queue
+import threading
+import time
+import uuid
+
+from lib.tools.corpus import get_corpus
+from lib.tools.workers import is_writer
+
+logger = logging.getLogger(__name__)
+
+class IngestionQueue:
+    """Background workers that extract, chunk and index uploaded books.
+
+    Jobs are kept in the corpus catalog rather than in memory. Only the writer
+    process runs them; with several workers, uploads accepted elsewhere are
+    picked up from the catalog every `poll_interval` seconds. Jobs a previous
+    writer was still processing when it died are failed at the same time, so
+    they can be uploaded again instead of showing processing forever.
+    """
+    def __init__(self, workers: int = 1, history: int = 1000, poll_interval: float = 2.0):
+        self.history = history
+        self.poll_interval = poll_interval
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._workers = [
+            threading.Thread(target=self._run, name=f"ingest-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, file_path: Path) -> str:
+        """Queue a file for ingestion and return its job id"""
+        job_id = uuid.uuid4().hex[:12]
+        catalog = get_corpus().catalog
+        catalog.add_job({
+            "job_id": job_id,
+            "file": file_path.name,
+            "path": str(file_path),
+            "status": "queued",
+            "submitted_at": time.time(),
+            "finished_at": None,
+            "error": None
+        }, history=self.history)
+        catalog.mark_queued(file_path)
+        if is_writer():
+            self._queue.put(job_id)
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return get_corpus().catalog.job(job_id)
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        return get_corpus().catalog.jobs()
+
+    def _run(self):
+        catalog = get_corpus().catalog
+        while True:
+            try:
+                job_id = self._queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                if is_writer():
+                    for job in catalog.fail_abandoned_jobs("Ingestion was interrupted because the worker processing it stopped; please upload the file again"):
+                        logger.warning("Ingestion of %s was interrupted by a writer restart", job["path"])
+                    for job_id in catalog.queued_jobs():
+                        self._queue.put(job_id)
+                continue
+            # Claiming is atomic, so a job queued locally and found by polling runs once
+            job = catalog.claim_job(job_id)
+            if job is None:
+                continue
+            try:
+                get_corpus().ingest(Path(job["path"]))
+                catalog.finish_job(job_id, "indexed")
+            except Exception as e:
+                logger.warning("Ingestion failed for %s: %s", job["path"], e)
+                catalog.finish_job(job_id, "failed", str(e))
+                catalog.mark_failed(job["path"], str(e))
+
+_ingestion_queue: Optional[IngestionQueue] = None
+_ingestion_lock = threading.Lock()
+
+def get_ingestion_queue() -> IngestionQueue:
+    """Process-wide ingestion queue, started on first use"""
+    global _ingestion_queue
+    with _ingestion_lock:
+        if _ingestion_queue is None:
+            _ingestion_queue = IngestionQueue()
+        return _ingestion_queue
@@ -0,0 +1,149 @@
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+
+from lib.tools.scheduler import PRIORITY_GENERATE, get_llm_scheduler
+from lib.tools.tracing import LLM_COALESCED, record_llm_call, span
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "32"))
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "180"))
+REQUEST_MAX_WORKERS = int(os.getenv("REQUEST_MAX_WORKERS", "32"))
+# Identical concurrent (model, prompt) calls share one upstream request unless LLM_COALESCE=0
+LLM_COALESCE = os.getenv("LLM_COALESCE", "1") == "1"
+
+# Blocking Gemini calls run here so each one can be given a deadline
+_llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="llm")
+# Whole agent pipelines run here so they never block the event loop
+_request_executor = ThreadPoolExecutor(max_workers=REQUEST_MAX_WORKERS, thread_name_prefix="request")
+
+# (model name, prompt) -> future shared by every caller waiting on that call
+_inflight: Dict[Tuple[str, str], Future] = {}
+_inflight_lock = threading.Lock()
+
+# Set while running work that may be abandoned, such as a speculative answer
+_cancel_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("llm_cancel", default=None)
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when a model call does not finish within its deadline"""
+
+class LLMCancelledError(Exception):
+    """Raised instead of starting a model call for work that has been cancelled"""
+
+def run_cancellable(cancel: threading.Event, func: Callable, *args, **kwargs) -> Any:
+    """Run func so that any model call it has not started yet is skipped once `cancel` is set"""
+    token = _cancel_event.set(cancel)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _cancel_event.reset(token)
+
+def _check_cancelled():
+    cancel = _cancel_event.get()
+    if cancel is not None and cancel.is_set():
+        raise LLMCancelledError("Model call skipped because its work was cancelled")
+
+def _model_name(model) -> str:
+    return getattr(model, "model_name", type(model).__name__)
+
+def generate(model, prompt: str, timeout: float = None, priority: int = PRIORITY_GENERATE, **kwargs) -> Any:
+    """Call model.generate_content on the bounded LLM pool with a per-call timeout.
+
+    Upstream calls go through the LLM scheduler, which admits them by priority
+    and may raise OverloadedError. Plain (non-streaming) calls are single-flight:
+    while one caller is waiting on a prompt, identical calls to the same model
+    wait for its response, or its exception, instead of going upstream again.
+    """
+    timeout = timeout or LLM_TIMEOUT
+    _check_cancelled()
+    if kwargs or not LLM_COALESCE:
+        return get_llm_scheduler().run(priority, _generate_upstream, model, prompt, timeout, **kwargs)
+
+    key = (_model_name(model), prompt)
+    with _inflight_lock:
+        shared = _inflight.get(key)
+        leader = shared is None
+        if leader:
+            shared = _inflight[key] = Future()
+
+    if not leader:
+        LLM_COALESCED.inc(model=key[0])
+        with span("llm.coalesced"):
+            try:
+                return shared.result(timeout=timeout)
+            except FuturesTimeoutError:
+                raise LLMTimeoutError(f"Model call timed out after {timeout:.0f}s")
+            except LLMCancelledError:
+                pass
+        # The call we joined belonged to cancelled work and never went upstream, so make it ourselves
+        return generate(model, prompt, timeout=timeout, priority=priority)
+
+    try:
+        response = get_llm_scheduler().run(priority, _generate_upstream, model, prompt, timeout)
+        shared.set_result(response)
+        return response
+    except BaseException as e:
+        shared.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+def _generate_upstream(model, prompt: str, timeout: float, **kwargs) -> Any:
+    # The work may have been cancelled while this call waited for admission
+    _check_cancelled()
+    model_name = _model_name(model)
+    start = time.perf_counter()
+    outcome = "error"
+    future = _llm_executor.submit(model.generate_content, prompt, **kwargs)
+    try:
+        with span("llm.generate"):
+            response = future.result(timeout=timeout)
+        outcome = "ok"
+        return response
+    except FuturesTimeoutError:
+        outcome = "timeout"
+        # A running call cannot be cancelled; its slot is freed only when the upstream request finishes
+        if not future.cancel():
+            get_llm_scheduler().hold_until_done(future)
+        raise LLMTimeoutError(f"Model call timed out after {timeout:.0f}s")
+    finally:
+        record_llm_call(model_name, len(prompt) if isinstance(prompt, str) else 0, time.perf_counter() - start, outcome)
+
+def generate_stream(model, prompt: str, timeout: float = None, priority: int = PRIORITY_GENERATE) -> Iterator[str]:
+    """Stream generate_content text chunks, applying the timeout to each chunk.
+
+    The answer is generated while its chunks are read, so the scheduler slot
+    is held until the stream is exhausted, fails or is closed by the caller.
+    """
+    timeout = timeout or LLM_TIMEOUT
+    _check_cancelled()
+    scheduler = get_llm_scheduler()
+    with scheduler.slot(priority):
+        chunks = iter(scheduler.call(_generate_upstream, model, prompt, timeout, stream=True))
+        with span("llm.stream"):
+            while True:
+                future = _llm_executor.submit(next, chunks, None)
+                try:
+                    chunk = future.result(timeout=timeout)
+                except FuturesTimeoutError:
+                    # The chunk read keeps running in its thread, so it keeps counting against the cap
+                    if not future.cancel():
+                        scheduler.hold_until_done(future)
+                    raise LLMTimeoutError(f"Model stream stalled for {timeout:.0f}s")
+                if chunk is None:
+                    return
+                yield chunk.text
+
+async def run_blocking(func: Callable, *args, timeout: float = None, **kwargs) -> Any:
+    """Run a blocking agent pipeline off the event loop, bounded by REQUEST_MAX_WORKERS"""
+    loop = asyncio.get_running_loop()
+    # Carry the request's trace into the worker thread
+    context = contextvars.copy_context()
+    future = loop.run_in_executor(_request_executor, functools.partial(context.run, func, *args, **kwargs))
+    return await asyncio.wait_for(future, timeout=timeout or REQUEST_TIMEOUT)
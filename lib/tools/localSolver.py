@@ -0,0 +1,234 @@
+from typing import Any, Dict, List, Optional, Tuple
+from fractions import Fraction
+import re
+
+from lib.tools.expression import CompiledExpression, compile_expression, lookup_unit
+
+# Phrases that may introduce a computable question; anything else left over sends the question to the LLM
+LEAD_IN = re.compile(
+    r"^(?:please\s+)?(?:what\s+is|what's|whats|calculate|compute|evaluate|work\s+out|find|solve|convert)"
+    r"(?:\s+the\s+value\s+of)?(?:\s+for\s+(?P<target>[a-z]))?\s*[:,]?\s*"
+)
+WORD_OPERATORS = [
+    (r"\bmultiplied\s+by\b", "*"), (r"\bdivided\s+by\b", "/"), (r"\btimes\b", "*"),
+    (r"\bplus\b", "+"), (r"\bminus\b", "-"), ("×", "*"), ("÷", "/"), ("−", "-")
+]
+ARITHMETIC = re.compile(r"^[\d\s.+\-*/^()]+$")
+EQUATION = re.compile(r"^[\d\s.+\-*/^()a-z]+=[\d\s.+\-*/^()a-z]+$")
+NUMBER = r"(-?\d+(?:\.\d+)?)"
+
+MAX_EXPRESSION_CHARS = 200
+MAX_STEPS = 20
+# Integers from 2^53 up are not all representable as floats, so such results are not shown as exact
+MAX_EXACT_INTEGER = 2 ** 53
+# Values of the variable at which an equation is evaluated: two fix the line, the others check it is one
+PROBES = (0.0, 1.0, 3.0, -7.0)
+SYMBOLS = {"+": "+", "-": "-", "*": "×", "/": "÷", "^": "^"}
+
+# Temperature scales, converted by formula rather than by factor
+SCALES = {
+    "c": "c", "celsius": "c", "°c": "c", "degrees celsius": "c",
+    "f": "f", "fahrenheit": "f", "°f": "f", "degrees fahrenheit": "f",
+    "k": "k", "kelvin": "k", "kelvins": "k"
+}
+UNIT = r"([a-z°]+(?:\s+(?:celsius|fahrenheit))?)"
+CONVERSION = re.compile(rf"^{NUMBER}\s*{UNIT}\s+(?:to|in|into|as)\s+{UNIT}$")
+HOW_MANY = re.compile(rf"^how\s+many\s+{UNIT}\s+(?:are\s+)?(?:in|per)\s+(?:an?\s+|one\s+|{NUMBER}\s*)?{UNIT}$")
+
+def format_number(value) -> str:
+    """Integers exactly, simple fractions as n/d, anything else to 12 significant figures"""
+    if isinstance(value, Fraction) and value.denominator != 1:
+        return f"{value.numerator}/{value.denominator} ≈ {float(value):.6g}"
+    if isinstance(value, int):
+        return str(value)
+    value = _clean(float(value))
+    if value.is_integer() and abs(value) < MAX_EXACT_INTEGER:
+        return str(int(value))
+    return f"{value:.12g}"
+
+def _clean(value: float) -> float:
+    """value to 12 significant figures, dropping float noise such as 0.1 + 0.2 = 0.30000000000000004"""
+    return float(f"{value:.12g}")
+
+def _relation(value: float) -> str:
+    """"=" when format_number shows value exactly, up to float noise, and "≈" when it rounds it"""
+    shown = float(format_number(value).split(" ≈ ")[-1])
+    return "=" if abs(shown - value) <= 1e-15 * abs(value) else "≈"
+
+def _exact(value: float) -> bool:
+    """False for integral floats too large to be sure every digit is right, e.g. 99999999999999999999"""
+    return not (float(value).is_integer() and abs(value) >= MAX_EXACT_INTEGER)
+
+def _to_kelvin(value: float, unit: str) -> float:
+    scale = SCALES[unit]
+    if scale == "c":
+        return value + 273.15
+    if scale == "f":
+        return (value - 32) * 5 / 9 + 273.15
+    return value
+
+def _from_kelvin(value: float, unit: str) -> float:
+    scale = SCALES[unit]
+    if scale == "c":
+        return value - 273.15
+    if scale == "f":
+        return (value - 273.15) * 9 / 5 + 32
+    return value
+
+def _compile(expression: str) -> Optional[CompiledExpression]:
+    """The expression engine's compiled form, or None when it cannot be read only one way"""
+    compiled = compile_expression(" ".join(expression.split()))
+    # A division followed by implicit multiplication, as in 6/2(1+2), has no agreed reading
+    return None if compiled.ambiguous else compiled
+
+class LocalSolver:
+    """Answers fully computable questions - arithmetic, unit conversions and
+    linear equations in one variable - without any model call.
+
+    A question is only answered when every word of it is understood; anything
+    ambiguous returns None so the caller falls through to the LLM. Expressions
+    are evaluated by the shared expression engine, under its safety limits.
+    """
+    name = "Local Solver"
+
+    def solve(self, question: str) -> Optional[Dict[str, Any]]:
+        text = question.strip().lower().rstrip("?.! ")
+        if not text or len(text) > MAX_EXPRESSION_CHARS:
+            return None
+        text = re.sub(r"\s+please$", "", text)
+        lead_in = LEAD_IN.match(text)
+        # "solve for y: ..." names the variable wanted; only an equation in exactly that variable answers it
+        target = lead_in.group("target") if lead_in else None
+        body = text[lead_in.end():] if lead_in else text
+        for pattern, replacement in WORD_OPERATORS:
+            body = re.sub(pattern, replacement, body)
+        body = body.strip()
+
+        handlers = (self._equation,) if target else (self._arithmetic, self._conversion, self._equation)
+        for handler in handlers:
+            try:
+                result = handler(body, target) if handler == self._equation else handler(body)
+            except (ArithmeticError, ValueError, OverflowError, RecursionError):
+                result = None
+            if result is not None:
+                answer, tool = result
+                return {
+                    "answer": answer,
+                    "agent_used": self.name,
+                    "tools_used": [tool],
+                    "sources": []
+                }
+        return None
+
+    def _arithmetic(self, body: str) -> Optional[Tuple[str, str]]:
+        if not ARITHMETIC.match(body) or not re.search(r"\d\s*[+\-*/^]|\)\s*[+\-*/^]", body):
+            return None
+        compiled = _compile(body)
+        # Any juxtaposition such as 2(3) or (1+2)(3) is left to the LLM, which can ask what was meant
+        if compiled is None or compiled.implicit:
+            return None
+        value = compiled.evaluate()
+        trace = compiled.trace()
+        if not all(_exact(number) for step in trace for number in step[1:]):
+            return None
+        expression = re.sub(r"\s+", "", body)
+        answer = f"**{expression} {_relation(value)} {format_number(value)}**"
+        if len(trace) > 1:
+            steps = [
+                f"{format_number(left)} {SYMBOLS[op]} {format_number(right)} {_relation(result)} {format_number(result)}"
+                for op, left, right, result in trace[:MAX_STEPS]
+            ]
+            answer += "\n\nWorking it out in order of operations:\n" + "\n".join(
+                f"{number}. {step}" for number, step in enumerate(steps, start=1)
+            )
+        return answer, "calculator"
+
+    def _conversion(self, body: str) -> Optional[Tuple[str, str]]:
+        match = CONVERSION.match(body)
+        if match:
+            amount, source, target = float(match.group(1)), match.group(2), match.group(3)
+        else:
+            match = HOW_MANY.match(body)
+            if not match:
+                return None
+            target, amount, source = match.group(1), float(match.group(2) or 1), match.group(3)
+        source, target = source.strip(), target.strip()
+        if source == target:
+            return None
+
+        if source in SCALES or target in SCALES:
+            if source not in SCALES or target not in SCALES or SCALES[source] == SCALES[target]:
+                return None
+            value = _from_kelvin(_to_kelvin(amount, source), target)
+            explanation = "Temperatures are converted by formula: °F = °C × 9/5 + 32 and K = °C + 273.15."
+        else:
+            source_unit, target_unit = lookup_unit(source), lookup_unit(target)
+            if source_unit is None or target_unit is None or source_unit[1] != target_unit[1]:
+                return None
+            ratio = source_unit[0] / target_unit[0]
+            value = amount * ratio
+            explanation = f"Since 1 {source} {_relation(ratio)} {format_number(ratio)} {target}, multiply {format_number(amount)} by {format_number(ratio)}."
+        return f"**{format_number(amount)} {source} {_relation(value)} {format_number(value)} {target}**\n\n{explanation}", "unit_converter"
+
+    def _equation(self, body: str, target: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        condition = re.match(r"^([a-z])\s+(?:if|when|where|given)\s+", body)
+        if condition:
+            if target and condition.group(1) != target:
+                return None
+            target = condition.group(1)
+            body = body[condition.end():]
+        if not EQUATION.match(body):
+            return None
+        words = set(re.findall(r"[a-z]+", body))
+        # A single one-letter variable, and the one asked for if the question names it
+        if len(words) != 1 or len(next(iter(words))) != 1:
+            return None
+        variable = next(iter(words))
+        if target and variable != target:
+            return None
+        line = self._linear(body, variable)
+        if line is None:
+            return None
+        # a*variable + b = 0, so variable = -b/a; simple rationals such as 1/3 are shown as fractions
+        a, b = line
+        if _rational(a) == 0:
+            return None
+        coefficient, constant, solution = _rational(a), _rational(-b), _rational(-b / a)
+        steps = [
+            f"Collect the {variable} terms on the left and the constants on the right: {format_number(coefficient)}{variable} = {format_number(constant)}",
+            f"Divide both sides by {format_number(coefficient)}: {variable} = {format_number(solution)}"
+        ]
+        answer = f"**{variable} = {format_number(solution)}**\n\n" + "\n".join(
+            f"{number}. {step}" for number, step in enumerate(steps, start=1)
+        )
+        return answer, "equation_solver"
+
+    def _linear(self, body: str, variable: str) -> Optional[Tuple[float, float]]:
+        """(a, b) with left - right == a*variable + b, or None when the equation is not linear in variable"""
+        left_text, right_text = body.split("=")
+        sides = []
+        for text in (left_text, right_text):
+            # The engine has no variables, so each side is evaluated with the variable replaced by a number
+            values = []
+            for probe in PROBES:
+                compiled = _compile(text.replace(variable, f"({probe:g})"))
+                if compiled is None:
+                    return None
+                values.append(compiled.evaluate())
+            sides.append(values)
+        differences = [left - right for left, right in zip(*sides)]
+        b = differences[0]
+        a = differences[1] - b
+        for probe, difference in zip(PROBES[2:], differences[2:]):
+            expected = a * probe + b
+            if abs(difference - expected) > 1e-9 * max(1.0, abs(difference), abs(expected)):
+                return None
+        return a, b
+
+def _rational(value: float):
+    """value as a Fraction when it is a simple rational that a decimal would round, e.g. 1/3"""
+    value = _clean(value)
+    fraction = Fraction(value).limit_denominator(1000)
+    if float(f"{value:.6g}") != value and abs(float(fraction) - value) <= 1e-12 * max(1.0, abs(value)):
+        return fraction
+    return value
@@ -0,0 +1,82 @@
+from typing import Any, Callable, Dict, List, NamedTuple
+from pathlib import Path
+import json
+import logging
+import os
+import threading
+
+from lib.tools.extractor import SUPPORTED_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+class ManifestDiff(NamedTuple):
+    added: List[str]
+    changed: List[str]
+    removed: List[str]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+class CorpusManifest:
+    """Persistent record of path, size, mtime and content hash for every supported book"""
+    def __init__(self, books_dir: Path, manifest_path: str = ".cache/manifest.json"):
+        self.books_dir = Path(books_dir)
+        self.manifest_path = Path(manifest_path)
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.entries)
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(data, encoding="utf-8")
+        os.replace(tmp_path, self.manifest_path)
+
+    def scan(self, digest: Callable[[Path], str]) -> ManifestDiff:
+        """Walk the books directory once; only files whose size or mtime moved are re-hashed"""
+        added, changed = [], []
+        seen = set()
+        if self.books_dir.exists():
+            for file_path in self.books_dir.rglob("*"):
+                if not file_path.is_file() or file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+                    continue
+                doc_id = str(file_path)
+                seen.add(doc_id)
+                try:
+                    stat = file_path.stat()
+                    previous = self.entries.get(doc_id)
+                    if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+                        continue
+                    entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest(file_path)}
+                except OSError as e:
+                    logger.warning("Error scanning file %s: %s", file_path, e)
+                    continue
+                if previous is None:
+                    added.append(doc_id)
+                elif previous["digest"] != entry["digest"]:
+                    changed.append(doc_id)
+                with self._lock:
+                    self.entries[doc_id] = entry
+
+        with self._lock:
+            removed = [doc_id for doc_id in self.entries if doc_id not in seen]
+            for doc_id in removed:
+                del self.entries[doc_id]
+        return ManifestDiff(added, changed, removed)
+
+    def record(self, file_path: Path, digest: str):
+        """Record a file that was ingested outside a scan, e.g. straight after an upload"""
+        stat = file_path.stat()
+        with self._lock:
+            self.entries[str(file_path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest}
+
+    def files(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{"path": doc_id, **entry} for doc_id, entry in self.entries.items()]
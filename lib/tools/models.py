@@ -0,0 +1,56 @@
+from typing import Dict, List, Optional
+import os
+import threading
+
+import google.generativeai as genai
+
+from lib.tools.fakeModel import fake_model_from_env
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+# Environment variable that selects the model name for each role
+MODEL_ROLES = {
+    "generator": "GEMINI_GENERATOR_MODEL",
+    "classifier": "GEMINI_CLASSIFIER_MODEL"
+}
+
+class ModelRegistry:
+    """Process-wide, lazily built model clients shared by every agent.
+
+    Clients are keyed by model name, so roles configured with the same model
+    share one instance. All of them go through the genai default client, which
+    keeps a single pooled connection open between requests. With
+    LLM_BACKEND=fake the clients are offline stand-ins instead (see fakeModel).
+    """
+    def __init__(self, backend: str = "gemini"):
+        self.backend = backend
+        self._models: Dict[str, genai.GenerativeModel] = {}
+        self._lock = threading.Lock()
+
+    def model_name(self, role: str) -> str:
+        if role not in MODEL_ROLES:
+            raise ValueError(f"Unknown model role: {role}")
+        return os.getenv(MODEL_ROLES[role], DEFAULT_MODEL)
+
+    def get(self, role: str) -> genai.GenerativeModel:
+        name = self.model_name(role)
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                model = fake_model_from_env(name) if self.backend == "fake" else genai.GenerativeModel(name)
+                self._models[name] = model
+            return model
+
+    def clients(self) -> List[genai.GenerativeModel]:
+        with self._lock:
+            return list(self._models.values())
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_model_registry() -> ModelRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry(backend=os.getenv("LLM_BACKEND", "gemini"))
+        return _registry
@@ -0,0 +1,191 @@
+from typing import Dict, List, Tuple
+import math
+import re
+import threading
+
+from lib.tools.retrieval import TOKEN_PATTERN
+
+# Seed questions the local classifier is trained on at startup
+TRAINING_EXAMPLES = {
+    "math": [
+        "solve 3x + 2 = 11",
+        "solve for x: 2x - 5 = 9",
+        "calculate 17 * 23 + 4",
+        "what is 45 divided by 9",
+        "find the derivative of x^2 + 3x",
+        "integrate sin(x) dx from 0 to pi",
+        "what is the integral of 1/x",
+        "factor the polynomial x^2 - 5x + 6",
+        "find the roots of the quadratic equation x^2 + 4x + 4 = 0",
+        "what is the area of a circle with radius 5",
+        "find the perimeter of a rectangle with sides 4 and 7",
+        "prove that the square root of 2 is irrational",
+        "what is the probability of rolling two sixes",
+        "find the mean median and mode of 3 5 7 7 9",
+        "simplify the fraction 18/24",
+        "what is 15 percent of 80",
+        "evaluate the limit of sin(x)/x as x approaches 0",
+        "solve the system of equations x + y = 10 and x - y = 2",
+        "what is the pythagorean theorem",
+        "find the slope of the line through (1, 2) and (3, 8)",
+        "compute the determinant of a 2x2 matrix",
+        "what is the sum of an arithmetic series",
+        "explain the binomial theorem",
+        "convert 0.75 to a fraction",
+        "what is the formula for the volume of a sphere",
+        "how do logarithms work",
+        "find the angle in a right triangle using trigonometry",
+        "what is the standard deviation of a data set",
+        "multiply the matrices",
+        "calculate the hypotenuse of a triangle with legs 3 and 4",
+    ],
+    "physics": [
+        "a 5 kg mass accelerates at 2 m/s^2 what is the force",
+        "what is newton's second law",
+        "a car travels at 20 m/s for 10 s how far does it go",
+        "calculate the kinetic energy of a 2 kg ball moving at 3 m/s",
+        "what is the gravitational potential energy of a 10 kg object at 5 m",
+        "explain conservation of momentum",
+        "what is the speed of light",
+        "how does a transformer change voltage",
+        "calculate the current through a 10 ohm resistor at 5 volts",
+        "what is ohm's law",
+        "explain the photoelectric effect",
+        "what is the wavelength of a wave with frequency 50 hz",
+        "how does friction affect motion on an inclined plane",
+        "a projectile is launched at 30 degrees with velocity 20 m/s",
+        "what is the first law of thermodynamics",
+        "explain entropy and heat transfer",
+        "what is the magnetic field around a current carrying wire",
+        "how do electromagnetic waves propagate",
+        "describe the bohr model of the atom",
+        "explain quantum tunneling",
+        "what is the acceleration due to gravity on earth",
+        "calculate the work done by a 50 n force over 3 m",
+        "what is the power of a 60 w bulb running for 2 hours",
+        "explain refraction of light through a lens",
+        "what is the pressure at the bottom of a fluid column",
+        "how does a pendulum's period depend on its length",
+        "what is terminal velocity",
+        "explain special relativity and time dilation",
+        "what is the momentum of a 3 kg object at 4 m/s",
+        "describe simple harmonic motion of a spring",
+    ],
+    "general": [
+        "who wrote romeo and juliet",
+        "what caused the first world war",
+        "explain photosynthesis in plants",
+        "what is the capital of france",
+        "how does the immune system fight infection",
+        "summarize the plot of to kill a mockingbird",
+        "what is a metaphor in poetry",
+        "explain supply and demand",
+        "what are the causes of climate change",
+        "how do i write a good essay introduction",
+        "what is dna and how does it replicate",
+        "explain the water cycle",
+        "what is the difference between a virus and bacteria",
+        "who was napoleon bonaparte",
+        "what is a chemical bond",
+        "how does the stock market work",
+        "what is the theme of the great gatsby",
+        "explain the french revolution",
+        "what are the parts of a cell",
+        "how do vaccines work",
+        "what is democracy",
+        "explain the process of evolution by natural selection",
+        "what is an ecosystem",
+        "how do i improve my study habits",
+        "what is the periodic table",
+        "explain how computers store data",
+        "what is a database index",
+        "describe the structure of the human heart",
+        "what is the meaning of irony",
+        "how does a bill become a law",
+    ],
+}
+
+# Pattern features that individual words do not capture well
+FEATURE_PATTERNS = {
+    "__equation__": re.compile(r"[a-z\d)]\s*[\+\-\*/\^=]\s*[a-z\d(]"),
+    "__number__": re.compile(r"\d"),
+    "__unit__": re.compile(r"\d\s*(kg|g|m/s\^?2?|m/s|km/h|m|cm|km|s|n|j|kj|w|kw|v|a|hz|ohm|ohms|pa|k|c)\b"),
+}
+
+def extract_features(question: str) -> List[str]:
+    """Unigrams, bigrams and pattern flags for a question"""
+    text = question.lower()
+    words = TOKEN_PATTERN.findall(text)
+    features = list(words)
+    features.extend(f"{first}_{second}" for first, second in zip(words, words[1:]))
+    features.extend(name for name, pattern in FEATURE_PATTERNS.items() if pattern.search(text))
+    return features
+
+class LocalClassifier:
+    """Multinomial naive Bayes over word n-grams, used to route obvious questions without an LLM call"""
+    def __init__(self, examples: Dict[str, List[str]] = None, threshold: float = 0.95, smoothing: float = 0.5, min_features: int = 2):
+        self.threshold = threshold
+        self.smoothing = smoothing
+        self.min_features = min_features
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._train(examples or TRAINING_EXAMPLES)
+
+    def _train(self, examples: Dict[str, List[str]]):
+        self.labels = list(examples)
+        self.feature_counts: Dict[str, Dict[str, int]] = {label: {} for label in self.labels}
+        self.totals: Dict[str, int] = {label: 0 for label in self.labels}
+        vocabulary = set()
+        for label, questions in examples.items():
+            for question in questions:
+                for feature in extract_features(question):
+                    self.feature_counts[label][feature] = self.feature_counts[label].get(feature, 0) + 1
+                    self.totals[label] += 1
+                    vocabulary.add(feature)
+        self.vocabulary = vocabulary
+
+    def predict(self, question: str) -> Tuple[str, float]:
+        """Most likely label and its posterior probability"""
+        # Unseen features carry no evidence, so only known ones are scored
+        features = [feature for feature in extract_features(question) if feature in self.vocabulary]
+        if not features:
+            return self.labels[0], 0.0
+        vocabulary_size = len(self.vocabulary)
+        log_scores = {}
+        for label in self.labels:
+            denominator = self.totals[label] + self.smoothing * vocabulary_size
+            log_scores[label] = sum(
+                math.log((self.feature_counts[label].get(feature, 0) + self.smoothing) / denominator)
+                for feature in features
+            )
+        best = max(log_scores, key=log_scores.get)
+        normalizer = sum(math.exp(score - log_scores[best]) for score in log_scores.values())
+        return best, 1.0 / normalizer
+
+    def decide(self, question: str) -> Tuple[str, float]:
+        """Return (label, probability) if confident enough, otherwise (None, probability)"""
+        label, probability = self.predict(question)
+        known = sum(1 for feature in extract_features(question) if feature in self.vocabulary)
+        decided = probability >= self.threshold and known >= self.min_features
+        return (label if decided else None), probability
+
+    def classify(self, question: str) -> Tuple[str, float]:
+        """decide() for routing, counting which path each question takes"""
+        label, probability = self.decide(question)
+        self._count(f"local_{label}" if label is not None else "llm_fallback")
+        return label, probability
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counters = dict(self.counters)
+        total = sum(counters.values())
+        local = sum(count for name, count in counters.items() if name.startswith("local_"))
+        return {
+            "threshold": self.threshold,
+            "decisions": counters,
+            "local_rate": local / total if total else 0.0
+        }
@@ -0,0 +1,99 @@
+from typing import Callable, List, Optional, Tuple
+from collections import OrderedDict
+import logging
+import re
+import threading
+
+from lib.tools.llm import generate
+from lib.tools.scheduler import PRIORITY_CLASSIFY, OverloadedError
+
+logger = logging.getLogger(__name__)
+
+class RelevanceRanker:
+    """Ranks candidate documents for a question in a bounded number of batched LLM calls"""
+    def __init__(self, batch_size: int = 20, max_batches: int = 3, preview_chars: int = 500, cache_size: int = 256):
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.preview_chars = preview_chars
+        self.cache_size = cache_size
+        self.llm_calls = 0
+        self._cache: "OrderedDict[Tuple[str, str, str], List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_candidates(self) -> int:
+        return self.batch_size * self.max_batches
+
+    def rank(self, model, question: str, corpus_version: str, doc_ids: List[str],
+             preview: Callable[[str, int], str], scope: str = "") -> List[str]:
+        """Return the doc ids judged relevant, most relevant first.
+
+        doc_ids should be ordered best candidate first: only the first
+        max_candidates are considered, so a query never costs more than
+        max_batches calls. preview(doc_id, limit) is only called on a cache
+        miss, and only for the documents actually sent to the model.
+        """
+        key = (" ".join(question.lower().split()), corpus_version, scope)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return list(self._cache[key])
+
+        candidates = [(doc_id, preview(doc_id, self.preview_chars)) for doc_id in doc_ids[:self.max_candidates]]
+        ranked: List[str] = []
+        complete = True
+        for start in range(0, len(candidates), self.batch_size):
+            batch = candidates[start:start + self.batch_size]
+            try:
+                ranked.extend(self._rank_batch(model, question, batch))
+            except OverloadedError:
+                raise
+            except Exception as e:
+                logger.warning("AI relevance ranking failed: %s", e)
+                complete = False
+                # If AI fails, be very lenient - include documents with substantial content
+                ranked.extend(doc_id for doc_id, preview in batch if len(preview) > 100)
+
+        if complete:
+            with self._lock:
+                self._cache[key] = list(ranked)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return ranked
+
+    def _rank_batch(self, model, question: str, batch: List[Tuple[str, str]]) -> List[str]:
+        listing = "\n\n".join(
+            f"[{number}] {doc_id}\n{preview}..."
+            for number, (doc_id, preview) in enumerate(batch, start=1)
+        )
+        ranking_prompt = f"""
+        Which of these documents could help answer the question: "{question}"?
+
+        Documents:
+        {listing}
+
+        Be generous - if there's ANY connection, even loose, include the document.
+        Respond with only the numbers of the helpful documents, most relevant first, separated by commas.
+        Respond with "NONE" if every document is completely unrelated.
+        """
+
+        with self._lock:
+            self.llm_calls += 1
+        response = generate(model, ranking_prompt, priority=PRIORITY_CLASSIFY)
+        ranked = []
+        for number in re.findall(r"\d+", response.text):
+            index = int(number) - 1
+            if 0 <= index < len(batch) and batch[index][0] not in ranked:
+                ranked.append(batch[index][0])
+        return ranked
+
+_ranker: Optional[RelevanceRanker] = None
+_ranker_lock = threading.Lock()
+
+def get_relevance_ranker() -> RelevanceRanker:
+    """Process-wide relevance ranker so its cache is shared by every agent"""
+    global _ranker
+    with _ranker_lock:
+        if _ranker is None:
+            _ranker = RelevanceRanker()
+        return _ranker
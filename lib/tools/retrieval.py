@@ -0,0 +1,171 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from itertools import accumulate
+import heapq
+import math
+import re
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'can', 'did', 'do', 'does', 'for', 'from',
+    'how', 'i', 'if', 'in', 'into', 'is', 'it', 'its', 'me', 'my', 'of', 'on', 'or', 'so', 'than',
+    'that', 'the', 'their', 'then', 'there', 'these', 'this', 'to', 'was', 'we', 'were', 'what',
+    'when', 'where', 'which', 'who', 'why', 'will', 'with', 'you', 'your'
+}
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def chunk_text(text: str, passage_words: int = 200, overlap: int = 40) -> List[str]:
+    """Split text into overlapping passages of roughly passage_words words"""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, passage_words - overlap)
+    passages = []
+    for start in range(0, len(words), step):
+        passages.append(" ".join(words[start:start + passage_words]))
+        if start + passage_words >= len(words):
+            break
+    return passages
+
+def chunk_spans(data: bytes, passage_words: int = 200, overlap: int = 40) -> List[Tuple[int, int]]:
+    """Byte spans of the passages chunk_text would produce, over text stored by encode_text"""
+    if not data:
+        return []
+    # Single spaces separate the words, so word j ends at ends[j] + j and word j + 1 starts one byte later
+    ends = list(accumulate(map(len, data.split(b" "))))
+    words = len(ends)
+    step = max(1, passage_words - overlap)
+    spans = []
+    for start in range(0, words, step):
+        end = min(start + passage_words, words) - 1
+        spans.append((ends[start - 1] + start if start else 0, ends[end] + end))
+        if start + passage_words >= words:
+            break
+    return spans
+
+class Passage(NamedTuple):
+    """Span [start, end) of a document in a TextSegment; the text is decoded only when read"""
+    doc_id: str
+    position: int
+    start: int
+    end: int
+    source: Any
+
+    @property
+    def text(self) -> str:
+        return self.source.read(self.start, self.end)
+
+def span_passages(doc_id: str, source: Any, start: int, end: int, passage_words: int = 200, overlap: int = 40) -> List[Passage]:
+    """Passages of the document stored at [start, end) of source"""
+    data = source.read_bytes(start, end)
+    return [
+        Passage(doc_id, position, start + span_start, start + span_end, source)
+        for position, (span_start, span_end) in enumerate(chunk_spans(data, passage_words, overlap))
+    ]
+
+class CollectionStats(NamedTuple):
+    """Passage count, total passage length and per-term passage frequencies BM25 scores are relative to"""
+    passages: int
+    total_length: int
+    frequencies: Dict[str, int]
+
+def merge_stats(stats: Iterable[CollectionStats]) -> CollectionStats:
+    """Statistics of the union of several disjoint indexes, so their scores can be compared"""
+    passages, total_length, frequencies = 0, 0, {}
+    for part in stats:
+        passages += part.passages
+        total_length += part.total_length
+        for term, count in part.frequencies.items():
+            frequencies[term] = frequencies.get(term, 0) + count
+    return CollectionStats(passages, total_length, frequencies)
+
+class BM25Index:
+    """Inverted index over document passages with Okapi BM25 scoring"""
+    def __init__(self, k1: float = 1.5, b: float = 0.75, passage_words: int = 200, overlap: int = 40):
+        self.k1 = k1
+        self.b = b
+        self.passage_words = passage_words
+        self.overlap = overlap
+        self.passages: Dict[int, Passage] = {}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.lengths: Dict[int, int] = {}
+        self.doc_passages: Dict[str, List[int]] = {}
+        self.total_length = 0
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def add_document(self, doc_id: str, source: Any, start: int, end: int):
+        """Chunk and index the document stored at [start, end) of source, replacing any previous version of it"""
+        self.remove_document(doc_id)
+        passage_ids = []
+        for passage in span_passages(doc_id, source, start, end, self.passage_words, self.overlap):
+            tokens = tokenize(passage.text)
+            if not tokens:
+                continue
+            passage_id = self._next_id
+            self._next_id += 1
+            self.passages[passage_id] = passage
+            self.lengths[passage_id] = len(tokens)
+            self.total_length += len(tokens)
+            term_counts: Dict[str, int] = {}
+            for token in tokens:
+                term_counts[token] = term_counts.get(token, 0) + 1
+            for term, count in term_counts.items():
+                self.postings.setdefault(term, {})[passage_id] = count
+            passage_ids.append(passage_id)
+        self.doc_passages[doc_id] = passage_ids
+
+    def remove_document(self, doc_id: str):
+        for passage_id in self.doc_passages.pop(doc_id, []):
+            passage = self.passages.pop(passage_id)
+            self.total_length -= self.lengths.pop(passage_id)
+            for term in set(tokenize(passage.text)):
+                postings = self.postings.get(term)
+                if postings is None:
+                    continue
+                postings.pop(passage_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def relocate(self, doc_id: str, delta: int, source: Any):
+        """Point a document's passages at its copy in another segment, delta bytes from the old offsets"""
+        for passage_id in self.doc_passages.get(doc_id, []):
+            passage = self.passages[passage_id]
+            self.passages[passage_id] = passage._replace(start=passage.start + delta, end=passage.end + delta, source=source)
+
+    def stats(self, terms: Set[str]) -> CollectionStats:
+        """This index's statistics for the given query terms"""
+        return CollectionStats(
+            len(self.passages), self.total_length,
+            {term: len(self.postings[term]) for term in terms if term in self.postings}
+        )
+
+    def search(self, query: str, k: int = 10, stats: Optional[CollectionStats] = None) -> List[Tuple[Passage, float]]:
+        """Top-k passages for the query; only the postings of query terms are touched.
+
+        Scores are relative to this index unless `stats` describes a larger
+        collection it is part of, as when shards are searched together.
+        """
+        if not self.passages:
+            return []
+        terms = set(tokenize(query))
+        stats = stats or self.stats(terms)
+        n = stats.passages
+        avg_length = stats.total_length / n
+        scores: Dict[int, float] = {}
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            frequency = stats.frequencies.get(term, len(postings))
+            idf = math.log(1 + (n - frequency + 0.5) / (frequency + 0.5))
+            for passage_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[passage_id] / avg_length)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.passages[passage_id], score) for passage_id, score in best]
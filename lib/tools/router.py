@@ -0,0 +1,154 @@
+from typing import List, Optional, Tuple
+import json
+import logging
+import re
+
+from lib.tools.llm import generate
+from lib.tools.preRouter import LocalClassifier
+from lib.tools.scheduler import PRIORITY_CLASSIFY, OverloadedError
+from lib.tools.tracing import span
+
+logger = logging.getLogger(__name__)
+
+class Router:
+    """Picks the best specialist agent and its confidence in one classifier call"""
+    def __init__(self, agents: List, threshold: float = 6.0, pre_router: Optional[LocalClassifier] = None):
+        self.agents = agents
+        self.threshold = threshold
+        # Decides obvious questions locally before any classifier call is made
+        self.pre_router = pre_router
+
+    def _routing_prompt(self, question: str) -> str:
+        specialists = "\n".join(
+            f"- {agent.name}: {agent.description}"
+            for agent in self.agents
+        )
+        return f"""
+        Decide which specialist should answer this question.
+
+        Question: "{question}"
+
+        Specialists:
+        {specialists}
+
+        Consider:
+        - How closely the question matches each specialist's expertise
+        - Whether the question requires specialized knowledge in that domain
+        - Which specialist would provide the most accurate and helpful answer
+
+        Respond with only a JSON object of the form {{"agent": "<specialist name or NONE>", "confidence": <number from 1-10>}}.
+        Use "NONE" if no specialist fits the question well.
+        """
+
+    def _batch_routing_prompt(self, questions: List[str]) -> str:
+        specialists = "\n".join(
+            f"- {agent.name}: {agent.description}"
+            for agent in self.agents
+        )
+        listing = "\n".join(f"[{number}] {question}" for number, question in enumerate(questions, start=1))
+        return f"""
+        Decide which specialist should answer each of these questions.
+
+        Questions:
+        {listing}
+
+        Specialists:
+        {specialists}
+
+        Respond with only a JSON array containing one object per question, of the form
+        [{{"question": <question number>, "agent": "<specialist name or NONE>", "confidence": <number from 1-10>}}].
+        Use "NONE" if no specialist fits a question well.
+        """
+
+    def _lookup(self, decision) -> Tuple[Optional[object], float]:
+        try:
+            name = str(decision.get("agent", "")).strip().lower()
+            confidence = float(decision.get("confidence", 5.0))
+        except (ValueError, TypeError, AttributeError):
+            return None, 0.0
+        for agent in self.agents:
+            if agent.name.lower() == name:
+                return agent, confidence
+        return None, 0.0
+
+    def parse(self, text: str) -> Tuple[Optional[object], float]:
+        """Map a routing reply onto (agent, confidence); unknown or NONE maps to (None, 0)"""
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        if not match:
+            return None, 0.0
+        try:
+            return self._lookup(json.loads(match.group(0)))
+        except ValueError:
+            return None, 0.0
+
+    def parse_batch(self, text: str, count: int) -> List[Tuple[Optional[object], float]]:
+        """Map a batch routing reply onto one (agent, confidence) per question"""
+        decisions: List[Tuple[Optional[object], float]] = [(None, 0.0)] * count
+        match = re.search(r"\[.*\]", text, re.DOTALL)
+        if not match:
+            return decisions
+        try:
+            entries = json.loads(match.group(0))
+        except ValueError:
+            return decisions
+        for entry in entries:
+            try:
+                index = int(entry.get("question")) - 1
+            except (ValueError, TypeError, AttributeError):
+                continue
+            if 0 <= index < count:
+                decisions[index] = self._lookup(entry)
+        return decisions
+
+    def _apply_threshold(self, agent, confidence: float) -> Tuple[Optional[object], float]:
+        if agent is None or confidence < self.threshold:
+            return None, confidence
+        return agent, confidence
+
+    def _route_locally(self, question: str) -> Optional[Tuple[Optional[object], float]]:
+        """Pre-router decision, or None when the question needs the LLM classifier"""
+        if self.pre_router is None:
+            return None
+        label, probability = self.pre_router.classify(question)
+        if label is None:
+            return None
+        # A confident "general" label, or a subject with no specialist, goes to the tutor
+        agent = next((agent for agent in self.agents if agent.subject == label), None)
+        return agent, 10.0 * probability
+
+    def route(self, model, question: str) -> Tuple[Optional[object], float]:
+        """Return the chosen specialist and its confidence, or (None, score) for the general tutor"""
+        with span("route.local"):
+            local = self._route_locally(question)
+        if local is not None:
+            return local
+        try:
+            with span("route.llm"):
+                response = generate(model, self._routing_prompt(question), priority=PRIORITY_CLASSIFY)
+            agent, confidence = self.parse(response.text)
+        except OverloadedError:
+            raise
+        except Exception as e:
+            logger.warning("Routing failed: %s", e)
+            return None, 0.0
+        return self._apply_threshold(agent, confidence)
+
+    def route_batch(self, model, questions: List[str], batch_size: int = 20) -> List[Tuple[Optional[object], float]]:
+        """Route many questions with one classifier call per batch_size questions"""
+        with span("route.local"):
+            decisions: List[Optional[Tuple[Optional[object], float]]] = [self._route_locally(q) for q in questions]
+        pending = [index for index, decision in enumerate(decisions) if decision is None]
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            try:
+                with span("route.llm"):
+                    response = generate(model, self._batch_routing_prompt([questions[index] for index in chunk]), priority=PRIORITY_CLASSIFY)
+                parsed = self.parse_batch(response.text, len(chunk))
+            except OverloadedError:
+                raise
+            except Exception as e:
+                logger.warning("Batch routing failed: %s", e)
+                parsed = [(None, 0.0)] * len(chunk)
+            for index, (agent, confidence) in zip(chunk, parsed):
+                decisions[index] = self._apply_threshold(agent, confidence)
+        return decisions
@@ -0,0 +1,222 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+
+from lib.tools.tracing import LLM_REJECTED, LLM_RETRIES
+from lib.tools.workers import WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Lower values are admitted first: routing and relevance calls gate every answer, so they go ahead of generation
+PRIORITY_CLASSIFY = 0
+PRIORITY_GENERATE = 1
+
+class OverloadedError(Exception):
+    """Raised when a model call cannot be admitted or keeps hitting the upstream rate limit; served as a 503"""
+
+def _retryable_errors() -> Tuple[type, ...]:
+    try:
+        from google.api_core import exceptions
+    except ImportError:
+        return ()
+    return (exceptions.TooManyRequests, exceptions.ResourceExhausted, exceptions.ServiceUnavailable, exceptions.InternalServerError)
+
+RETRYABLE_ERRORS = _retryable_errors()
+
+class TokenBucket:
+    """Allows `rate` calls per second on average with bursts of up to `burst`; rate 0 means unlimited"""
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token, returning how long the caller must wait before using it"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            # A negative balance is a queue of reservations, each one 1/rate further out
+            return max(0.0, -self._tokens / self.rate)
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is available right now"""
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def refund(self):
+        """Give back a token that turned out not to be spent"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+class LLMScheduler:
+    """Admission control for every upstream model call.
+
+    At most `max_concurrency` calls run at once. Callers beyond that wait in a
+    priority queue of at most `max_queue` entries for up to `queue_timeout`
+    seconds; anything more is rejected straight away with OverloadedError.
+    Admitted calls take a token from the rate limiter, and calls failing with a
+    rate-limit or transient server error are retried with full-jitter
+    exponential backoff.
+    """
+    def __init__(self, max_concurrency: int = 16, rate_per_minute: float = 0.0, burst: float = 5.0,
+                 max_queue: int = 64, queue_timeout: float = 30.0, max_retries: int = 4,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.retries = 0
+        self._waiting: List[Tuple[int, int]] = []  # heap of (priority, arrival)
+        self._arrivals = itertools.count()
+        self._cond = threading.Condition()
+
+    def check_capacity(self):
+        """Fail fast before starting work, e.g. a streamed response, that could not be admitted"""
+        with self._cond:
+            if len(self._waiting) >= self.max_queue:
+                self.rejected += 1
+                LLM_REJECTED.inc(reason="queue_full")
+                raise OverloadedError("Too many questions are waiting for the model, please retry shortly")
+
+    def _acquire(self, priority: int):
+        with self._cond:
+            if self.active < self.max_concurrency and not self._waiting:
+                self.active += 1
+                self.admitted += 1
+                return
+            if len(self._waiting) >= self.max_queue:
+                self.rejected += 1
+                LLM_REJECTED.inc(reason="queue_full")
+                raise OverloadedError("Too many questions are waiting for the model, please retry shortly")
+
+            entry = (priority, next(self._arrivals))
+            heapq.heappush(self._waiting, entry)
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while not (self.active < self.max_concurrency and self._waiting[0] == entry):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        LLM_REJECTED.inc(reason="queue_timeout")
+                        raise OverloadedError("Timed out waiting for a model slot, please retry shortly")
+                    self._cond.wait(remaining)
+                self.active += 1
+                self.admitted += 1
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def _release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def hold_until_done(self, future: Future):
+        """Keep the caller's slot busy until future finishes, even after run() returns.
+
+        Called by a model call that timed out: its upstream request cannot be
+        stopped and keeps running in a worker thread, so it must go on counting
+        against max_concurrency until it completes.
+        """
+        with self._cond:
+            self.active += 1
+        future.add_done_callback(lambda _: self._release())
+
+    @contextmanager
+    def slot(self, priority: int) -> Iterator[None]:
+        """Hold one admitted slot for the whole block, e.g. while a streamed answer is read"""
+        self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Make one model call with rate limiting and retries; the caller must hold a slot"""
+        for attempt in range(self.max_retries + 1):
+            wait = self.bucket.reserve()
+            if wait:
+                time.sleep(wait)
+            try:
+                return func(*args, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    with self._cond:
+                        self.rejected += 1
+                    LLM_REJECTED.inc(reason="rate_limited")
+                    raise OverloadedError(f"The model is rate limited, please retry shortly ({e})") from e
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                with self._cond:
+                    self.retries += 1
+                LLM_RETRIES.inc()
+                logger.info("Retrying model call in %.2fs after: %s", delay, e)
+                time.sleep(delay)
+
+    def run(self, priority: int, func: Callable, *args, **kwargs) -> Any:
+        """Run one model call under admission control, rate limiting and retries"""
+        with self.slot(priority):
+            return self.call(func, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "active": self.active,
+                "waiting": len(self._waiting),
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "retries": self.retries,
+                "rate_per_minute": self.bucket.rate * 60
+            }
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Process-wide scheduler, configured from the LLM_* environment variables"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+                # The quota is for the whole deployment, so each worker gets its share
+                rate_per_minute=float(os.getenv("LLM_RATE_PER_MINUTE", "0")) / WORKERS,
+                burst=float(os.getenv("LLM_BURST", "5")),
+                max_queue=int(os.getenv("LLM_MAX_QUEUE", "64")),
+                queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "30")),
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+                backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "0.5")),
+                backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "8"))
+            )
+        return _scheduler
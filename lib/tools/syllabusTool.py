@@ -12,14 +12,11 @@ class SyllabusAgent(Agent):
     def can_handle(self, question: str) -> bool:
         return True  # Can attempt to handle any question using syllabus materials
     
-    def process(self, question: str, mode: str = "on-syllabus") -> Dict[str, Any]:
-        result = self.syllabus_tool.process(question)
-        return {
-            "answer": result["answer"],
-            "agent_used": self.name,
-            "tools_used": [self.syllabus_tool.name],
-            "sources": result.get("sources", [])
-        }
+    def prepare(self, question: str, mode: str = "on-syllabus") -> Dict[str, Any]:
+        result = self.syllabus_tool.prepare(question)
+        result["agent_used"] = self.name
+        result["tools_used"] = [self.syllabus_tool.name]
+        return result
 
 class SyllabusTool(Agent):
     def __init__(self):
@@ -31,29 +28,23 @@ class SyllabusTool(Agent):
     def can_handle(self, question: str) -> bool:
         return True  # Can attempt to process any question using syllabus materials
     
-    def process(self, question: str) -> Dict[str, Any]:
-        # Search for relevant documents for syllabus-based questions
-        relevant_docs = self._search_documents(question)
+    def prepare(self, question: str, mode: str = "on-syllabus") -> Dict[str, Any]:
+        # Search for relevant passages for syllabus-based questions
+        context = self._build_context(question)
         
-        if not relevant_docs:
+        if not context['passages']:
             return {
                 "answer": "I couldn't find any relevant content in the syllabus materials to answer your question. Please check if the topic is covered in your course materials or try the off-syllabus mode for general knowledge.",
                 "sources": []
             }
         
-        # Create context from relevant documents
-        doc_context = "\n\n".join([
-            f"From {doc['file']}:\n{doc['content']}"
-            for doc in relevant_docs
-        ])
-        
         prompt = f"""
         You are a knowledgeable tutor. Answer this question using ONLY the information provided from the syllabus materials below. Do not use external knowledge.
         
         Question: {question}
         
         Syllabus Materials:
-        {doc_context}
+        {context['context']}
         
         Instructions:
         - Answer based ONLY on the provided syllabus materials
@@ -63,16 +54,10 @@ class SyllabusTool(Agent):
         - Make your explanation suitable for a student following the syllabus
         """
         
-        sources = [doc['file'] for doc in relevant_docs]
+        sources = context['sources']
         
-        try:
-            response = self.model.generate_content(prompt)
-            return {
-                "answer": response.text,
-                "sources": sources
-            }
-        except Exception as e:
-            return {
-                "answer": f"I encountered an error processing your question: {str(e)}",
-                "sources": sources
-            }
\ No newline at end of file
+        return {
+            "prompt": prompt,
+            "sources": sources,
+            "context_tokens": context['tokens_used']
+        }
@@ -0,0 +1,165 @@
+from typing import Dict, Any, List, Optional, Tuple
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+import time
+
+from lib.tools.extractor import EXTRACTOR_VERSION, extract_many
+from lib.tools.tracing import span
+
+class TextCache:
+    """Persistent cache of extracted document text, keyed by content hash and extractor version"""
+    def __init__(self, cache_dir: str = ".cache/text", max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index_path = self.cache_dir / "index.json"
+        self._index: Dict[str, Dict[str, Any]] = self._load_index()
+        # Running total of cached bytes, so storing a file never re-sums the whole index
+        self._bytes = sum(entry["size"] for entry in self._index.values())
+        # path -> (size, mtime_ns, digest), so unchanged files are not re-hashed every request
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            index = json.loads(self._index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        # Drop entries whose text file has gone missing
+        return {key: entry for key, entry in index.items() if (self.cache_dir / f"{key}.txt").exists()}
+
+    def _save_index(self):
+        tmp_path = self._index_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._index), encoding="utf-8")
+        os.replace(tmp_path, self._index_path)
+
+    def file_digest(self, file_path: Path) -> str:
+        """SHA-256 of the file bytes, memoised on (size, mtime)"""
+        stat = file_path.stat()
+        with self._lock:
+            memo = self._digests.get(str(file_path))
+        if memo and memo[0] == stat.st_size and memo[1] == stat.st_mtime_ns:
+            return memo[2]
+
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with self._lock:
+            self._digests[str(file_path)] = (stat.st_size, stat.st_mtime_ns, digest)
+        return digest
+
+    def _key(self, digest: str) -> str:
+        return f"{digest}-v{EXTRACTOR_VERSION}"
+
+    def lookup(self, digest: str) -> Optional[str]:
+        key = self._key(digest)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            try:
+                text = (self.cache_dir / f"{key}.txt").read_text(encoding="utf-8")
+            except OSError:
+                self._bytes -= self._index.pop(key)["size"]
+                return None
+            entry["last_access"] = time.time()
+            return text
+
+    def store(self, digest: str, text: str, save: bool = True):
+        """Cache text for a digest; batch callers pass save=False and call flush() once at the end"""
+        key = self._key(digest)
+        data = text.encode("utf-8")
+        with self._lock:
+            (self.cache_dir / f"{key}.txt").write_bytes(data)
+            previous = self._index.get(key)
+            if previous is not None:
+                self._bytes -= previous["size"]
+            self._index[key] = {"size": len(data), "last_access": time.time()}
+            self._bytes += len(data)
+            self._evict()
+            if save:
+                self._save_index()
+
+    def flush(self):
+        with self._lock:
+            self._save_index()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        if self._bytes <= self.max_bytes:
+            return
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_access"]):
+            if self._bytes <= self.max_bytes:
+                break
+            self._bytes -= self._index.pop(key)["size"]
+            (self.cache_dir / f"{key}.txt").unlink(missing_ok=True)
+            self.evictions += 1
+
+    def get_text(self, file_path: Path) -> str:
+        """Return extracted text for a file, extracting only if its bytes are not cached yet"""
+        return self.get_texts([file_path])[file_path]
+
+    def get_texts(self, file_paths: List[Path], digests: Dict[Path, str] = None) -> Dict[Path, str]:
+        """Batch form of get_text; all cache misses are extracted together on the process pool"""
+        texts: Dict[Path, str] = {}
+        missing: Dict[Path, str] = {}
+        for file_path in file_paths:
+            digest = (digests or {}).get(file_path) or self.file_digest(file_path)
+            text = self.lookup(digest)
+            with self._lock:
+                if text is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            if text is not None:
+                texts[file_path] = text
+            else:
+                missing[file_path] = digest
+
+        if missing:
+            with span("extract"):
+                extracted = extract_many(list(missing))
+            for file_path, text in extracted.items():
+                self.store(missing[file_path], text, save=False)
+                texts[file_path] = text
+            # Rewriting the index once per batch rather than per file keeps a cold sync linear
+            self.flush()
+        return texts
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total_bytes = self._bytes
+            entries = len(self._index)
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": evictions,
+            "entries": entries,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes
+        }
+
+_text_cache: Optional[TextCache] = None
+_text_cache_lock = threading.Lock()
+
+def get_text_cache() -> TextCache:
+    """Process-wide text cache, configured from TEXT_CACHE_DIR and TEXT_CACHE_MAX_MB"""
+    global _text_cache
+    with _text_cache_lock:
+        if _text_cache is None:
+            _text_cache = TextCache(
+                cache_dir=os.getenv("TEXT_CACHE_DIR", ".cache/text"),
+                max_bytes=int(os.getenv("TEXT_CACHE_MAX_MB", "512")) * 1024 * 1024
+            )
+        return _text_cache
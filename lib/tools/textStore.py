@@ -0,0 +1,79 @@
+from typing import Optional
+from pathlib import Path
+import mmap
+import os
+import tempfile
+import threading
+
+# Dead bytes left by replaced or removed documents before a store is worth rewriting
+COMPACT_MIN_BYTES = 16 * 1024 * 1024
+
+def encode_text(text: str) -> bytes:
+    """Whitespace-normalised UTF-8, the form passages are sliced from.
+
+    Words are separated by single spaces, so passage spans decode to exactly
+    the text chunk_text produces from the original.
+    """
+    return " ".join(text.split()).encode("utf-8")
+
+def needs_compaction(total_bytes: int, live_bytes: int) -> bool:
+    """Whether dead bytes outweigh live ones by enough to rewrite the store"""
+    dead_bytes = total_bytes - live_bytes
+    return dead_bytes >= COMPACT_MIN_BYTES and dead_bytes > live_bytes
+
+class TextSegment:
+    """Append-only file of document text, read through a memory map that grows with it.
+
+    Documents are addressed by absolute byte offsets. Appends never move
+    existing bytes, so a span stays readable while other documents are added
+    or replaced; only compaction into a new segment changes offsets. Without
+    a path the segment is a private temporary file that the OS removes once
+    it is closed.
+    """
+    def __init__(self, path: Optional[Path] = None, directory: Optional[Path] = None):
+        self.path = path
+        if path is None:
+            if directory is not None:
+                Path(directory).mkdir(parents=True, exist_ok=True)
+            self._file = tempfile.TemporaryFile(dir=directory)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(path, "a+b")
+        self._map: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return os.fstat(self._file.fileno()).st_size
+
+    def append(self, data: bytes) -> int:
+        """Write data at the end of the segment and return its offset"""
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell()
+            self._file.write(data)
+            self._file.flush()
+            return offset
+
+    def _view(self, end: int) -> Optional[mmap.mmap]:
+        view = self._map
+        if view is not None and end <= len(view):
+            return view
+        with self._lock:
+            if self._map is None or end > len(self._map):
+                if self.size == 0:
+                    return None
+                # Remap to cover bytes appended since; readers still holding the old map keep using it
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._map
+
+    def read_bytes(self, start: int, end: int) -> bytes:
+        """Copy of the bytes in [start, end), and nothing else of the file"""
+        if end <= start:
+            return b""
+        view = self._view(end)
+        return view[start:end] if view is not None else b""
+
+    def read(self, start: int, end: int) -> str:
+        # A span cut for a token budget may end inside a multi-byte character
+        return self.read_bytes(start, end).decode("utf-8", errors="ignore")
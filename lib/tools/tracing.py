@@ -0,0 +1,164 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+import contextvars
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cache hit up to a slow generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Prompt size buckets in characters
+PROMPT_BUCKETS = (250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Prometheus-style counter with optional labels"""
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+class Histogram:
+    """Prometheus-style cumulative histogram with optional labels"""
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> (per-bucket counts, sum, count)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            counts, total, count = self._series.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _format_labels(self.label_names, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                labels = _format_labels(self.label_names, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+REQUEST_SECONDS = Histogram("tutor_request_seconds", "HTTP request latency until the response starts", ("method", "path", "status"))
+STAGE_SECONDS = Histogram("tutor_stage_seconds", "Time spent in each pipeline stage", ("stage",))
+LLM_CALLS = Counter("tutor_llm_calls_total", "Model calls made, by model and outcome", ("model", "outcome"))
+LLM_SECONDS = Histogram("tutor_llm_seconds", "Model call latency", ("model",))
+LLM_PROMPT_CHARS = Histogram("tutor_llm_prompt_chars", "Prompt size sent to the model in characters", ("model",), PROMPT_BUCKETS)
+LLM_COALESCED = Counter("tutor_llm_coalesced_total", "Model calls served by joining an identical in-flight call", ("model",))
+LLM_RETRIES = Counter("tutor_llm_retries_total", "Model calls retried after a rate-limit or transient server error")
+LLM_REJECTED = Counter("tutor_llm_rejected_total", "Model calls shed by the scheduler, by reason", ("reason",))
+
+METRICS = [REQUEST_SECONDS, STAGE_SECONDS, LLM_CALLS, LLM_SECONDS, LLM_PROMPT_CHARS, LLM_COALESCED, LLM_RETRIES, LLM_REJECTED]
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class Trace:
+    """Spans and model-call totals collected for one request"""
+    def __init__(self, name: str):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []  # (stage, start offset, duration)
+        self.llm_calls = 0
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+
+    def add_span(self, stage: str, start: float, duration: float):
+        with self._lock:
+            self.spans.append((stage, start - self.started, duration))
+
+    def add_llm_call(self, prompt_chars: int):
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_chars += prompt_chars
+
+    def server_timing(self) -> str:
+        """Per-stage totals formatted for the Server-Timing response header"""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for stage, _, duration in self.spans:
+                totals[stage] = totals.get(stage, 0.0) + duration
+        return ", ".join(f"{stage.replace('.', '-')};dur={duration * 1000:.1f}" for stage, duration in totals.items())
+
+    def summary(self) -> str:
+        with self._lock:
+            spans = " ".join(f"{stage}@{start * 1000:.0f}ms+{duration * 1000:.0f}ms" for stage, start, duration in self.spans)
+            return f"trace={self.trace_id} {self.name} llm_calls={self.llm_calls} prompt_chars={self.prompt_chars} {spans}"
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("tutor_trace", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def trace(name: str) -> Iterator[Trace]:
+    """Start a trace for the current request; spans opened below it are attached to it"""
+    active = Trace(name)
+    token = _current_trace.set(active)
+    try:
+        yield active
+    finally:
+        _current_trace.reset(token)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(active.summary())
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a pipeline stage into tutor_stage_seconds and the active trace, if any"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage=stage)
+        active = _current_trace.get()
+        if active is not None:
+            active.add_span(stage, start, duration)
+
+def record_llm_call(model_name: str, prompt_chars: int, seconds: float, outcome: str):
+    """Count one model call with its prompt size and latency"""
+    LLM_CALLS.inc(model=model_name, outcome=outcome)
+    LLM_SECONDS.observe(seconds, model=model_name)
+    LLM_PROMPT_CHARS.observe(prompt_chars, model=model_name)
+    active = _current_trace.get()
+    if active is not None:
+        active.add_llm_call(prompt_chars)
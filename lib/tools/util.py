@@ -1,6 +1,11 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List
-import math
+import os
+
+from lib.tools.expression import ExpressionError, describe, evaluate
+
+# Larger /ask/batch requests are rejected with 422 before any work is queued
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
 
 class QueryRequest(BaseModel):
     question: str
@@ -11,6 +16,12 @@ class QueryResponse(BaseModel):
     agent_used: str
     tools_used: List[str] = []
     sources: List[str] = []
+    context_tokens: int = 0  # Estimated syllabus tokens placed in the prompt
+    cached: bool = False
+
+class BatchQueryRequest(BaseModel):
+    questions: List[QueryRequest] = Field(max_length=BATCH_MAX_ITEMS)
+    concurrency: int = 4  # Maximum answers generated at the same time
 
 class Tool:
     """Base class for tools that agents can use"""
@@ -25,20 +36,19 @@ class CalculatorTool(Tool):
     def __init__(self):
         super().__init__(
             name="calculator",
-            description="Performs basic mathematical calculations"
+            description="Performs mathematical calculations with math functions and physics units"
         )
     
     def execute(self, expression: str) -> float:
-        """Safely evaluate mathematical expressions"""
+        """Safely evaluate mathematical expressions, including math functions and physics units"""
+        try:
+            return evaluate(expression)
+        except ExpressionError as e:
+            raise ValueError(f"Calculation error: {str(e)}")
+    
+    def describe(self, expression: str) -> str:
+        """Evaluate an expression and return the result with its unit, e.g. 3 min or 0.416667 m/s"""
         try:
-            expression = expression.replace(" ", "")
-            allowed_chars = set("0123456789+-*/().^**")
-            if not all(c in allowed_chars for c in expression):
-                raise ValueError("Invalid characters in expression")
-            
-            expression = expression.replace("^", "**")
-            
-            result = eval(expression, {"__builtins__": {}, "math": math})
-            return float(result)
-        except Exception as e:
-            raise ValueError(f"Calculation error: {str(e)}")
\ No newline at end of file
+            return describe(expression)
+        except ExpressionError as e:
+            raise ValueError(f"Calculation error: {str(e)}")
@@ -0,0 +1,73 @@
+from typing import Optional
+from pathlib import Path
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# uvicorn's --workers defaults to WEB_CONCURRENCY, so the same variable tells each worker it has siblings
+WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# With more than one worker, indexes and caches live in shared SQLite stores instead of process memory
+SHARED_STORES = WORKERS > 1 or os.getenv("SHARED_STORES", "0") == "1"
+
+class WriterLock:
+    """Advisory lock file electing the single process that scans, extracts and indexes books.
+
+    Every other worker only reads the shared stores. The lock is released when
+    the holder exits, and readers keep retrying so one of them takes over.
+    """
+    def __init__(self, path: str = ".cache/writer.lock"):
+        self.path = Path(path)
+        self.held = False
+        self._file = None
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """Try to become the writer without blocking; True if this process holds the lock"""
+        with self._lock:
+            if self.held:
+                return True
+            try:
+                import fcntl
+            except ImportError:
+                # No flock on this platform: every process writes, as in single-worker mode
+                self.held = True
+                return True
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            handle = open(self.path, "a+")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                return False
+            handle.seek(0)
+            handle.truncate()
+            handle.write(str(os.getpid()))
+            handle.flush()
+            self._file = handle
+            self.held = True
+            logger.info("Process %d is the corpus writer", os.getpid())
+            return True
+
+    def release(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.held = False
+
+_writer_lock: Optional[WriterLock] = None
+_writer_lock_guard = threading.Lock()
+
+def get_writer_lock() -> WriterLock:
+    """Process-wide writer lock at WRITER_LOCK"""
+    global _writer_lock
+    with _writer_lock_guard:
+        if _writer_lock is None:
+            _writer_lock = WriterLock(os.getenv("WRITER_LOCK", ".cache/writer.lock"))
+        return _writer_lock
+
+def is_writer() -> bool:
+    """Whether this process may change the corpus; always true with a single worker"""
+    return not SHARED_STORES or get_writer_lock().acquire()
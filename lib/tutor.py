@@ -1,10 +1,29 @@
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextvars
+import os
+import threading
 
 from lib.tools.agent import Agent
+from lib.tools.router import Router
+from lib.tools.preRouter import LocalClassifier
+from lib.tools.answerCache import AnswerCache, SharedAnswerCache, normalize_question
+from lib.tools.corpus import get_corpus
+from lib.tools.llm import run_cancellable
+from lib.tools.localSolver import LocalSolver
+from lib.tools.scheduler import OverloadedError, TokenBucket
+from lib.tools.tracing import span
+from lib.tools.workers import SHARED_STORES
 from lib.tools.mathTool import MathTool
 from lib.tools.physicsTool import PhysicsTool
 from lib.tools.syllabusTool import SyllabusAgent
 
+# Speculative answers run here, next to the routing call they race
+_speculation_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SPECULATIVE_MAX_WORKERS", "16")),
+    thread_name_prefix="speculative"
+)
+
 class TutorAgent(Agent):
     def __init__(self):
         super().__init__(
@@ -16,98 +35,286 @@ class TutorAgent(Agent):
             PhysicsTool()
         ]
         self.syllabus_agent = SyllabusAgent()
+        # Only use a specialized agent if its confidence is reasonably high
+        self.router = Router(
+            self.specialized_tools,
+            threshold=6.0,
+            pre_router=LocalClassifier(threshold=float(os.getenv("PRE_ROUTER_THRESHOLD", "0.95")))
+        )
+        cache_settings = dict(
+            max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+            near_duplicate_threshold=float(os.getenv("ANSWER_CACHE_NEAR_DUPLICATE", "0"))
+        )
+        # Several workers share one answer cache on disk, so a repeated question hits whichever worker gets it
+        if SHARED_STORES:
+            self.answer_cache = SharedAnswerCache(os.getenv("ANSWER_CACHE_DB", ".cache/answers.sqlite3"), **cache_settings)
+        else:
+            self.answer_cache = AnswerCache(**cache_settings)
+        # Arithmetic, unit conversions and linear equations are answered without the LLM unless LOCAL_SOLVER=0
+        self.local_solver = LocalSolver() if os.getenv("LOCAL_SOLVER", "1") == "1" else None
+        # Each speculation takes a token and wrong guesses keep it, capping wasted answers per minute
+        waste_per_minute = float(os.getenv("SPECULATIVE_MAX_WASTE_PER_MINUTE", "30"))
+        # Off-syllabus answers can start on the pre-router's best guess while the router decides;
+        # a budget of 0 allows no waste, and a TokenBucket would read it as unlimited
+        self.speculative = os.getenv("SPECULATIVE_ROUTING", "0") == "1" and waste_per_minute > 0
+        self.speculation_budget = TokenBucket(waste_per_minute / 60.0, burst=max(1.0, waste_per_minute / 6))
+        self.speculation_stats = {"speculated": 0, "hits": 0, "wasted": 0, "over_budget": 0}
+        self._speculation_lock = threading.Lock()
     
     def can_handle(self, question: str) -> bool:
         return True  # Tutor can handle any question by routing appropriately
     
-    def find_best_agent(self, question: str, mode: str) -> Agent:
-        """Intelligently find the most suitable agent using AI classification"""
+    def route(self, question: str, mode: str) -> Tuple[Agent, float]:
+        """Return the most suitable agent together with the router's confidence in it"""
         
-        # If mode is on-syllabus, use syllabus agent
         if mode == "on-syllabus":
+            return self._route_on_syllabus(question), 10.0
+        
+        # For off-syllabus mode, classify against every specialist in a single call
+        with span("route"):
+            best_agent, confidence = self.router.route(self.classifier_model, question)
+        
+        # Default to tutor agent for general off-syllabus questions
+        return best_agent or self, confidence
+    
+    def _route_on_syllabus(self, question: str) -> Agent:
+        """Specialist whose subject shard of the books should be searched first, else the syllabus agent.
+        
+        Only the local pre-router decides, so on-syllabus answers never wait for a classifier call;
+        the specialist's search still falls back to every shard when its own has no match.
+        """
+        pre_router = self.router.pre_router
+        if pre_router is None:
             return self.syllabus_agent
+        label, _ = pre_router.decide(question)
+        return next((agent for agent in self.specialized_tools if agent.subject == label), self.syllabus_agent)
+    
+    def find_best_agent(self, question: str, mode: str) -> Agent:
+        """Intelligently find the most suitable agent using AI classification"""
+        return self.route(question, mode)[0]
+    
+    def _corpus_version(self, mode: str) -> str:
+        """Version stamp of the books corpus for on-syllabus answers, empty otherwise"""
+        if mode != "on-syllabus":
+            return ""
+        corpus = get_corpus()
+        if not corpus.exists():
+            return ""
+        corpus.ensure_synced()
+        return corpus.version
+    
+    def _solve_locally(self, question: str, mode: str) -> Optional[Dict[str, Any]]:
+        """Answer for a fully computable off-syllabus question, or None when it needs the LLM.
         
-        # For off-syllabus mode, check specialized tools first
-        agent_scores = []
-        for agent in self.specialized_tools:
-            try:
-                if agent.can_handle(question):
-                    # Get confidence score for better routing
-                    confidence_prompt = f"""
-                    Rate how well suited the "{agent.name}" is for this question on a scale of 1-10.
-                    
-                    Question: "{question}"
-                    Agent specialty: {agent.description}
-                    
-                    Consider:
-                    - How closely the question matches the agent's expertise
-                    - Whether the question requires specialized knowledge in this domain
-                    - If this agent would provide the most accurate and helpful answer
-                    
-                    Respond with only a number from 1-10.
-                    """
-                    
-                    confidence_response = self.classifier_model.generate_content(confidence_prompt)
-                    try:
-                        score = float(confidence_response.text.strip())
-                        agent_scores.append((agent, score))
-                    except ValueError:
-                        agent_scores.append((agent, 5.0))  # Default score
-            except Exception:
+        On-syllabus questions always go to the syllabus agent, which answers from the books.
+        """
+        if self.local_solver is None or mode == "on-syllabus":
+            return None
+        with span("local_solver"):
+            return self.local_solver.solve(question)
+    
+    def process(self, question: str, mode: str = "off-syllabus", agent: Agent = None) -> Dict[str, Any]:
+        # Fully computable questions never reach the network
+        solved = self._solve_locally(question, mode)
+        if solved is not None:
+            return solved
+        return self._process_unsolved(question, mode, agent)
+    
+    def _process_unsolved(self, question: str, mode: str, agent: Agent = None) -> Dict[str, Any]:
+        """process() for a question the local solver has already declined"""
+        # Serve repeated questions from the answer cache
+        version = self._corpus_version(mode)
+        cached = self.answer_cache.get(question, mode, version)
+        if cached is not None:
+            cached["cached"] = True
+            return cached
+        
+        result = self._answer(question, mode, agent)
+        # Error answers are not cached so the next attempt retries the model
+        if not result.get("error"):
+            self.answer_cache.put(question, mode, version, result)
+        return result
+    
+    def process_stream(self, question: str, mode: str = "off-syllabus") -> Iterator[Dict[str, Any]]:
+        """Streaming counterpart of process: metadata first, then answer text as it is generated"""
+        solved = self._solve_locally(question, mode)
+        if solved is not None:
+            answer = solved.pop("answer")
+            yield {"event": "meta", **solved}
+            yield {"event": "token", "text": answer}
+            yield {"event": "done"}
+            return
+        
+        version = self._corpus_version(mode)
+        cached = self.answer_cache.get(question, mode, version)
+        if cached is not None:
+            answer = cached.pop("answer")
+            yield {"event": "meta", **cached, "cached": True}
+            yield {"event": "token", "text": answer}
+            yield {"event": "done"}
+            return
+        
+        best_agent = self.find_best_agent(question, mode)
+        if best_agent != self:
+            events = best_agent.process_stream(question, mode)
+        else:
+            events = super().process_stream(question, mode)
+        
+        result: Dict[str, Any] = {}
+        answer_parts = []
+        for event in events:
+            if event["event"] == "meta":
+                event.setdefault("agent_used", best_agent.name)
+                if best_agent != self:
+                    event["routed_by"] = self.name
+                result = {key: value for key, value in event.items() if key != "event"}
+            elif event["event"] == "token":
+                answer_parts.append(event["text"])
+            elif event["event"] == "error":
+                result["error"] = event["error"]
+            yield event
+        
+        # Error answers are not cached so the next attempt retries the model
+        if not result.get("error"):
+            result["answer"] = "".join(answer_parts)
+            self.answer_cache.put(question, mode, version, result)
+    
+    def process_batch(self, requests: List[Tuple[str, str]], concurrency: int = 4) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Answer many (question, mode) pairs, yielding (index, result) as each one completes.
+        
+        Identical questions are answered once, every item searches the same shared
+        corpus index, off-syllabus questions are routed in batched classifier calls,
+        and at most `concurrency` answers are generated at the same time.
+        """
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for index, (question, mode) in enumerate(requests):
+            groups.setdefault((normalize_question(question), mode), []).append(index)
+        keys = list(groups)
+        
+        get_corpus().ensure_synced()
+        # Locally solvable questions are answered here, once, and skip routing and generation
+        pending = []
+        for key in keys:
+            solved = self._solve_locally(requests[groups[key][0]][0], key[1])
+            if solved is None:
+                pending.append(key)
                 continue
+            for index in groups[key]:
+                yield index, solved
         
-        # Return specialized agent with highest confidence score (if score is high enough)
-        if agent_scores:
-            best_agent, best_score = max(agent_scores, key=lambda x: x[1])
-            # Only use specialized agent if confidence is reasonably high
-            if best_score >= 6.0:
-                return best_agent
+        off_syllabus = [key for key in pending if key[1] != "on-syllabus"]
+        try:
+            with span("route.batch"):
+                routes = self.router.route_batch(
+                    self.classifier_model,
+                    [requests[groups[key][0]][0] for key in off_syllabus]
+                )
+        except OverloadedError:
+            # Results are already streaming, so overload is reported per item below instead of as a 503
+            routes = [(None, 0.0)] * len(off_syllabus)
+        agents = {key: agent or self for key, (agent, _) in zip(off_syllabus, routes)}
+        for key in pending:
+            if key not in agents:
+                agents[key] = self._route_on_syllabus(requests[groups[key][0]][0])
         
-        # Default to tutor agent for general off-syllabus questions
-        return self
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch") as pool:
+            futures = {
+                # Each answer runs in its own copy of the caller's context so spans reach the request trace
+                pool.submit(contextvars.copy_context().run, self._process_unsolved, requests[groups[key][0]][0], key[1], agents[key]): key
+                for key in pending
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {
+                        "answer": f"I encountered an error processing your question: {str(e)}",
+                        "agent_used": self.name,
+                        "tools_used": [],
+                        "sources": [],
+                        "error": str(e)
+                    }
+                for index in groups[key]:
+                    yield index, result
     
-    def process(self, question: str, mode: str = "off-syllabus") -> Dict[str, Any]:
-        # Find the best agent for this question
-        best_agent = self.find_best_agent(question, mode)
+    def _count_speculation(self, outcome: str):
+        with self._speculation_lock:
+            self.speculation_stats[outcome] += 1
+    
+    def _answer_speculatively(self, question: str, mode: str) -> Dict[str, Any]:
+        """Start answering with the pre-router's most likely agent while the router decides.
+        
+        The guess is kept when the router agrees. Otherwise it is cancelled, so any
+        model call it has not started yet is skipped, and the chosen agent answers.
+        """
+        label, _ = self.router.pre_router.predict(question)
+        guess = next((agent for agent in self.specialized_tools if agent.subject == label), self)
+        cancel = threading.Event()
+        context = contextvars.copy_context()
+        speculative = _speculation_executor.submit(context.run, run_cancellable, cancel, self._run_agent, guess, question, mode)
+        self._count_speculation("speculated")
+        
+        try:
+            best_agent = self.find_best_agent(question, mode)
+        except BaseException:
+            cancel.set()
+            raise
+        if best_agent == guess:
+            self.speculation_budget.refund()
+            self._count_speculation("hits")
+            return speculative.result()
         
+        cancel.set()
+        speculative.cancel()
+        self._count_speculation("wasted")
+        return self._run_agent(best_agent, question, mode)
+    
+    def _answer(self, question: str, mode: str, agent: Agent = None) -> Dict[str, Any]:
+        if agent is None and self.speculative and mode != "on-syllabus":
+            if self.speculation_budget.try_acquire():
+                return self._answer_speculatively(question, mode)
+            self._count_speculation("over_budget")
+        
+        # Find the best agent for this question
+        best_agent = agent or self.find_best_agent(question, mode)
+        return self._run_agent(best_agent, question, mode)
+    
+    def _run_agent(self, best_agent: Agent, question: str, mode: str) -> Dict[str, Any]:
         if best_agent != self:
             # Delegate to specialized agent
             result = best_agent.process(question, mode)
             return {
                 "answer": result["answer"],
-                "agent_used": result["agent_used"],
+                "agent_used": result.get("agent_used", best_agent.name),
                 "tools_used": result.get("tools_used", []),
                 "sources": result.get("sources", []),
-                "routed_by": self.name
+                "context_tokens": result.get("context_tokens", 0),
+                "routed_by": self.name,
+                "error": result.get("error")
             }
-        else:
-            # Handle general off-syllabus questions directly
-            prompt = f"""
-            You are a knowledgeable and helpful tutor. Answer this question clearly and educationally.
-            
-            Question: {question}
-            
-            Instructions:
-            - Provide comprehensive but accessible explanations
-            - Break down complex topics into understandable parts
-            - Use examples to illustrate concepts when helpful
-            - Encourage learning and curiosity
-            - If the question spans multiple subjects, address each aspect appropriately
-            - Make your explanation suitable for a student seeking to learn
-            """
-            
-            try:
-                response = self.model.generate_content(prompt)
-                return {
-                    "answer": response.text,
-                    "agent_used": self.name,
-                    "tools_used": [],
-                    "sources": []
-                }
-            except Exception as e:
-                return {
-                    "answer": f"I encountered an error processing your question: {str(e)}",
-                    "agent_used": self.name,
-                    "tools_used": [],
-                    "sources": []
-                }
\ No newline at end of file
+        # Handle general off-syllabus questions directly
+        return super().process(question, mode)
+    
+    def prepare(self, question: str, mode: str = "off-syllabus") -> Dict[str, Any]:
+        """Prompt for general questions the tutor answers itself"""
+        prompt = f"""
+        You are a knowledgeable and helpful tutor. Answer this question clearly and educationally.
+        
+        Question: {question}
+        
+        Instructions:
+        - Provide comprehensive but accessible explanations
+        - Break down complex topics into understandable parts
+        - Use examples to illustrate concepts when helpful
+        - Encourage learning and curiosity
+        - If the question spans multiple subjects, address each aspect appropriately
+        - Make your explanation suitable for a student seeking to learn
+        """
+        return {
+            "prompt": prompt,
+            "agent_used": self.name,
+            "tools_used": [],
+            "sources": []
+        }
@@ -9,34 +9,36 @@ async function askQuestion() {
             document.getElementById('response').style.display = 'none';
             
             try {
-                const response = await fetch('/ask', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ 
-                        question: question,
-                        mode: "off-syllabus"
-                    })
-                });
-                
-                const data = await response.json();
-                
-                // Render markdown content
-                const markdownAnswer = marked.parse(data.answer);
-                document.getElementById('answer').innerHTML = markdownAnswer;
-                
-                // Build agent info with better formatting
-                let agentInfo = `<strong>Handled by:</strong> ${data.agent_used}`;
-                if (data.tools_used && data.tools_used.length > 0) {
-                    agentInfo += ` | <strong>🛠️ Tools used:</strong> ${data.tools_used.join(', ')}`;
-                }
-                
-                document.getElementById('agent-details').innerHTML = agentInfo;
-                document.getElementById('response').style.display = 'block';
+                const answer = createMarkdownRenderer(document.getElementById('answer'));
+                document.getElementById('answer').innerHTML = '';
                 
-                // Smooth scroll to response
-                document.getElementById('response').scrollIntoView({ 
-                    behavior: 'smooth', 
-                    block: 'start' 
+                await streamAnswer(question, "off-syllabus", {
+                    onMeta(data) {
+                        // Build agent info with better formatting
+                        let agentInfo = `<strong>Handled by:</strong> ${data.agent_used}`;
+                        if (data.tools_used && data.tools_used.length > 0) {
+                            agentInfo += ` | <strong>🛠️ Tools used:</strong> ${data.tools_used.join(', ')}`;
+                        }
+                        
+                        document.getElementById('agent-details').innerHTML = agentInfo;
+                        document.getElementById('loading').style.display = 'none';
+                        document.getElementById('response').style.display = 'block';
+                        
+                        // Smooth scroll to response
+                        document.getElementById('response').scrollIntoView({ 
+                            behavior: 'smooth', 
+                            block: 'start' 
+                        });
+                    },
+                    // Render markdown content as it streams in
+                    onToken(text) {
+                        answer.append(text);
+                    },
+                    onError(text) {
+                        document.getElementById('loading').style.display = 'none';
+                        document.getElementById('response').style.display = 'block';
+                        answer.append(text);
+                    }
                 });
                 
             } catch (error) {
@@ -93,8 +93,11 @@
                     fileInput.value = '';
                     document.getElementById('selected-files').style.display = 'none';
                     
-                    // Refresh books status
+                    // Refresh books status, then again once indexing has finished
                     setTimeout(checkBooks, 1000);
+                    if (result.ingestion_jobs && result.ingestion_jobs.length > 0) {
+                        waitForIngestion(result.ingestion_jobs, uploadStatus);
+                    }
                 } else {
                     uploadStatus.className = 'upload-status error';
                     uploadStatus.innerHTML = `<strong>❌ Upload failed:</strong> ${result.error}`;
@@ -105,6 +108,38 @@
             }
         }
 
+        async function waitForIngestion(jobs, uploadStatus) {
+            const pending = new Set(jobs.map(job => job.job_id));
+            const failed = [];
+            const progress = document.createElement('div');
+            uploadStatus.appendChild(progress);
+            
+            while (pending.size > 0) {
+                progress.innerHTML = `<span>⏳</span> Indexing ${pending.size} file(s) so they become searchable...`;
+                await new Promise(resolve => setTimeout(resolve, 1500));
+                
+                for (const jobId of Array.from(pending)) {
+                    try {
+                        const response = await fetch(`/ingest-status/${jobId}`);
+                        const job = await response.json();
+                        if (job.status === 'indexed') {
+                            pending.delete(jobId);
+                        } else if (job.status === 'failed' || response.status === 404) {
+                            pending.delete(jobId);
+                            failed.push(job.file || jobId);
+                        }
+                    } catch (error) {
+                        console.error('Error checking ingestion status:', error);
+                    }
+                }
+            }
+            
+            progress.innerHTML = failed.length > 0
+                ? `<span>⚠️</span> Could not index: ${failed.join(', ')}`
+                : '<span>🔎</span> All uploaded files are now searchable.';
+            checkBooks();
+        }
+
         async function checkBooks() {
             try {
                 const response = await fetch('/check-books');
@@ -115,7 +150,7 @@
                     statusDiv.className = 'books-status success';
                     statusDiv.innerHTML = `
                         <strong>✅ Your knowledge library is ready!</strong>
-                        <p>Found ${data.files.length} files in your books directory. You can now ask questions about your materials.</p>
+                        <p>Found ${data.total} files in your books directory. You can now ask questions about your materials.</p>
                         <div class="file-list">
                             ${data.files.map(file => `
                                 <div class="file-item">
@@ -123,6 +158,7 @@
                                 </div>
                             `).join('')}
                         </div>
+                        ${data.total > data.files.length ? `<p style="color: var(--text-muted);">Showing the first ${data.files.length} of ${data.total} files.</p>` : ''}
                     `;
                 } else if (data.exists) {
                     statusDiv.className = 'books-status error';
@@ -157,50 +193,49 @@
             document.getElementById('response').style.display = 'none';
             
             try {
-                const response = await fetch('/ask', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ 
-                        question: question,
-                        mode: "on-syllabus"
-                    })
-                });
-                
-                const data = await response.json();
-                
-                // Debug: Log the response data
-                console.log('Response data:', data);
-                
-                // Render markdown content
-                const markdownAnswer = marked.parse(data.answer);
-                document.getElementById('answer').innerHTML = markdownAnswer;
-                
-                // Handle sources with better formatting
-                const sourcesDiv = document.getElementById('sources');
-                const sourcesList = document.getElementById('sources-list');
-                
-                if (data.sources && data.sources.length > 0) {
-                    sourcesList.innerHTML = data.sources.map(source => 
-                        `<li><span>📖</span> ${source}</li>`
-                    ).join('');
-                    sourcesDiv.style.display = 'block';
-                } else {
-                    sourcesDiv.style.display = 'none';
-                }
-                
-                // Build agent info with better formatting
-                let agentInfo = `<strong>Handled by:</strong> ${data.agent_used}`;
-                if (data.tools_used && data.tools_used.length > 0) {
-                    agentInfo += ` | <strong>🛠️ Tools used:</strong> ${data.tools_used.join(', ')}`;
-                }
-                
-                document.getElementById('agent-details').innerHTML = agentInfo;
-                document.getElementById('response').style.display = 'block';
+                const answer = createMarkdownRenderer(document.getElementById('answer'));
+                document.getElementById('answer').innerHTML = '';
                 
-                // Smooth scroll to response
-                document.getElementById('response').scrollIntoView({ 
-                    behavior: 'smooth', 
-                    block: 'start' 
+                await streamAnswer(question, "on-syllabus", {
+                    onMeta(data) {
+                        // Handle sources with better formatting
+                        const sourcesDiv = document.getElementById('sources');
+                        const sourcesList = document.getElementById('sources-list');
+                        
+                        if (data.sources && data.sources.length > 0) {
+                            sourcesList.innerHTML = data.sources.map(source => 
+                                `<li><span>📖</span> ${source}</li>`
+                            ).join('');
+                            sourcesDiv.style.display = 'block';
+                        } else {
+                            sourcesDiv.style.display = 'none';
+                        }
+                        
+                        // Build agent info with better formatting
+                        let agentInfo = `<strong>Handled by:</strong> ${data.agent_used}`;
+                        if (data.tools_used && data.tools_used.length > 0) {
+                            agentInfo += ` | <strong>🛠️ Tools used:</strong> ${data.tools_used.join(', ')}`;
+                        }
+                        
+                        document.getElementById('agent-details').innerHTML = agentInfo;
+                        document.getElementById('loading').style.display = 'none';
+                        document.getElementById('response').style.display = 'block';
+                        
+                        // Smooth scroll to response
+                        document.getElementById('response').scrollIntoView({ 
+                            behavior: 'smooth', 
+                            block: 'start' 
+                        });
+                    },
+                    // Render markdown content as it streams in
+                    onToken(text) {
+                        answer.append(text);
+                    },
+                    onError(text) {
+                        document.getElementById('loading').style.display = 'none';
+                        document.getElementById('response').style.display = 'block';
+                        answer.append(text);
+                    }
                 });
                 
             } catch (error) {
@@ -0,0 +1,65 @@
+// Read Server-Sent Events from POST /ask/stream and hand each event to the callbacks
+async function streamAnswer(question, mode, { onMeta, onToken, onError }) {
+            const response = await fetch('/ask/stream', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    question: question,
+                    mode: mode
+                })
+            });
+
+            if (!response.ok || !response.body) {
+                throw new Error(`Request failed with status ${response.status}`);
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                // Events are separated by a blank line
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const frame = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+
+                    let eventName = 'message';
+                    let data = '';
+                    frame.split('\n').forEach(line => {
+                        if (line.startsWith('event: ')) eventName = line.slice(7);
+                        else if (line.startsWith('data: ')) data += line.slice(6);
+                    });
+
+                    const payload = data ? JSON.parse(data) : {};
+                    if (eventName === 'meta' && onMeta) onMeta(payload);
+                    else if (eventName === 'token' && onToken) onToken(payload.text);
+                    else if (eventName === 'error' && onError) onError(payload.text);
+                    else if (eventName === 'done') return;
+                }
+            }
+        }
+
+// Re-render markdown at most once per animation frame while text streams in
+function createMarkdownRenderer(element) {
+            let text = '';
+            let scheduled = false;
+            return {
+                append(chunk) {
+                    text += chunk;
+                    if (scheduled) return;
+                    scheduled = true;
+                    requestAnimationFrame(() => {
+                        scheduled = false;
+                        element.innerHTML = marked.parse(text);
+                    });
+                },
+                text() {
+                    return text;
+                }
+            };
+        }
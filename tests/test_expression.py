@@ -0,0 +1,64 @@
+import pytest
+
+from lib.tools.expression import ExpressionError, describe, evaluate, find_expressions, lookup_unit
+
+@pytest.mark.parametrize("source, expected", [
+    ("2+3*4", 14),
+    ("(2+3)*4", 20),
+    ("10 - 4 - 3", 3),
+    ("12/3/2", 2),
+    ("-2^2", -4),
+    ("2^-1", 0.5),
+    ("sqrt(16) + sin(pi/2)", 5),
+])
+def test_precedence(source, expected):
+    assert evaluate(source) == pytest.approx(expected)
+
+@pytest.mark.parametrize("source", ["2^3^2", "2**3**2"])
+def test_power_is_right_associative(source):
+    assert evaluate(source) == 512
+
+@pytest.mark.parametrize("source, value, description", [
+    ("5 km", 5000, "5 km"),
+    ("100 km/h", 100000 / 3600, "100 km/h"),
+    ("5 min - 2 min", 180, "3 min"),
+    ("3 km / 2 h", 3000 / 7200, "0.416667 m/s"),
+    ("1 kg * 9.8 m/s^2", 9.8, "9.8 N"),
+])
+def test_units_are_converted(source, value, description):
+    assert evaluate(source) == pytest.approx(value)
+    assert describe(source) == description
+
+def test_unit_names():
+    assert lookup_unit("miles")[0] == pytest.approx(1609.344)
+    assert lookup_unit("km")[0] == 1000
+
+def test_incompatible_units_are_rejected():
+    with pytest.raises(ExpressionError):
+        evaluate("1 kg + 1 m")
+
+@pytest.mark.parametrize("source", [
+    "__import__('os')",
+    "os.system(1)",
+    "[].__class__",
+    "open(1)",
+    "exec(1)",
+    "lambda",
+    "x",
+    "2+",
+])
+def test_injection_is_rejected(source):
+    with pytest.raises(ExpressionError):
+        evaluate(source)
+
+@pytest.mark.parametrize("source", ["9^9^9", "2^1001", "1.5^2000"])
+def test_power_cap(source):
+    with pytest.raises(ExpressionError, match="Power too large"):
+        evaluate(source)
+
+def test_non_finite_results_are_rejected():
+    with pytest.raises(ExpressionError):
+        evaluate("1e308*10")
+
+def test_find_expressions():
+    assert find_expressions("What is 0.5 * 2 kg * (3 m/s)^2 and sqrt(16)?") == ["0.5 * 2 kg * (3 m/s)^2", "sqrt(16)"]
@@ -0,0 +1,82 @@
+import pytest
+
+from lib.tools.retrieval import BM25Index, chunk_spans, chunk_text, merge_stats, tokenize
+from lib.tools.textStore import TextSegment, encode_text
+
+DOCUMENTS = {
+    "photosynthesis.txt": "Photosynthesis converts light energy into chemical energy in plants.",
+    "plants.txt": "Plants need water and light to grow.",
+    "newton.txt": "Newton's laws describe motion and force.",
+    "conservation.txt": "Energy is conserved: energy in a closed system stays constant, energy changes form.",
+}
+
+def build_index(documents, segment):
+    index = BM25Index()
+    for doc_id, text in documents.items():
+        data = encode_text(text)
+        start = segment.append(data)
+        index.add_document(doc_id, segment, start, start + len(data))
+    return index
+
+@pytest.fixture
+def segment():
+    return TextSegment()
+
+@pytest.fixture
+def index(segment):
+    return build_index(DOCUMENTS, segment)
+
+def ranking(index, query, k=10):
+    return [passage.doc_id for passage, _ in index.search(query, k)]
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("What is the Energy of a photon?") == ["energy", "photon"]
+
+def test_chunk_spans_match_chunk_text():
+    text = " ".join(f"word{i}" for i in range(450))
+    data = encode_text(text)
+    passages = [data[start:end].decode() for start, end in chunk_spans(data, 200, 40)]
+    assert passages == chunk_text(text, 200, 40)
+
+@pytest.mark.parametrize("query, expected", [
+    ("light energy", ["photosynthesis.txt", "conservation.txt", "plants.txt"]),
+    ("energy", ["conservation.txt", "photosynthesis.txt"]),
+    ("water", ["plants.txt"]),
+    ("quantum", []),
+])
+def test_top_k_ordering(index, query, expected):
+    assert ranking(index, query) == expected
+
+def test_top_k_is_truncated(index):
+    assert ranking(index, "light energy", k=2) == ["photosynthesis.txt", "conservation.txt"]
+
+def test_search_is_deterministic(index):
+    first = [(passage.doc_id, score) for passage, score in index.search("light energy")]
+    for _ in range(3):
+        assert [(passage.doc_id, score) for passage, score in index.search("light energy")] == first
+
+def test_remove_and_replace(index, segment):
+    index.remove_document("conservation.txt")
+    assert ranking(index, "energy") == ["photosynthesis.txt"]
+
+    data = encode_text("Water carries energy.")
+    start = segment.append(data)
+    index.add_document("plants.txt", segment, start, start + len(data))
+    assert ranking(index, "water") == ["plants.txt"]
+    assert ranking(index, "grow") == []
+    assert index.postings.keys() == set(tokenize(" ".join([DOCUMENTS["photosynthesis.txt"], DOCUMENTS["newton.txt"], "Water carries energy."])))
+
+def test_shards_score_like_one_index(index, segment):
+    shards = [
+        build_index({doc_id: DOCUMENTS[doc_id] for doc_id in ("photosynthesis.txt", "plants.txt")}, segment),
+        build_index({doc_id: DOCUMENTS[doc_id] for doc_id in ("newton.txt", "conservation.txt")}, segment),
+    ]
+    terms = set(tokenize("light energy"))
+    stats = merge_stats(shard.stats(terms) for shard in shards)
+    merged = sorted(
+        ((passage.doc_id, score) for shard in shards for passage, score in shard.search("light energy", 10, stats)),
+        key=lambda hit: hit[1], reverse=True
+    )
+    expected = [(passage.doc_id, score) for passage, score in index.search("light energy")]
+    assert [doc_id for doc_id, _ in merged] == [doc_id for doc_id, _ in expected]
+    assert [score for _, score in merged] == pytest.approx([score for _, score in expected])